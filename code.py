@@ -4,6 +4,7 @@ import board
 import time
 import sys
 import random
+import gc
 from constants import *
 from hardware import HardwareManager, AudioSystem
 from uart import UartManager
@@ -12,6 +13,7 @@ from connection import ConnectionManager
 from instruments import InstrumentManager
 from synth import Synthesizer
 from logging import log, TAG_CANDIDE, COLOR_CYAN, COLOR_BLUE, COLOR_MAGENTA, COLOR_GREEN, COLOR_YELLOW, COLOR_RESET
+from ticks import ticks_ms, ticks_diff
 
 def _cycle_log(message):
     """Special logging effect for startup messages."""
@@ -30,6 +32,46 @@ def _cycle_log(message):
             print(f"\033[u\033[K{colored_text}{COLOR_RESET}", file=sys.stderr)
         time.sleep(0.1)
 
+class Telemetry:
+    """Loop timing and system counters, answered over the text protocol.
+    
+    Loop rate and worst loop time cover the time since the last query.
+    """
+    def __init__(self, midi_interface, synthesizer):
+        self.midi = midi_interface
+        self.synthesizer = synthesizer
+        self.loops = 0
+        self.worst_loop_ms = 0
+        self._last_loop = ticks_ms()
+        self._window_start = self._last_loop
+        
+    def loop(self):
+        """Count one main loop pass"""
+        now = ticks_ms()
+        elapsed = ticks_diff(now, self._last_loop)
+        if elapsed > self.worst_loop_ms:
+            self.worst_loop_ms = elapsed
+        self._last_loop = now
+        self.loops += 1
+        
+    def report(self):
+        """Build the stats line and start a new window"""
+        now = ticks_ms()
+        window = ticks_diff(now, self._window_start) or 1
+        throughput = self.midi.get_throughput()
+        parse = self.midi.get_parse_stats()
+        notes = self.synthesizer.note_manager
+        line = (f"{STATS_PREFIX}lps={self.loops * 1000 // window}|worst={self.worst_loop_ms}"
+                f"|rxb={throughput['bytes_total']}|bps={throughput['bytes_per_sec']}"
+                f"|msg={parse['parsed']}|rej={parse['rejected']}"
+                f"|thr={parse['thresholded']}|rate={parse['rate_limited']}"
+                f"|voices={len(notes.notes)}|stolen={notes.stolen}"
+                f"|blocks={len(self.synthesizer.blocks)}|mem={gc.mem_free()}")
+        self.loops = 0
+        self.worst_loop_ms = 0
+        self._window_start = now
+        return line
+
 class Candide:
     def __init__(self):
         _cycle_log("\nWakeup Candide!\n")
@@ -75,6 +117,15 @@ class Candide:
         log(TAG_CANDIDE, "Connecting managers...")
         self.instrument_manager.set_connection_manager(self.connection_manager)
         self.connection_manager.set_instrument_manager(self.instrument_manager)
+        self.instrument_manager.set_midi_interface(self.midi_interface)
+        
+        # Stats on request, without turning on logging
+        self.telemetry = Telemetry(self.midi_interface, self.synthesizer)
+        self.text_uart.add_command(STATS_QUERY, self.telemetry.report)
+
+        # Compile instruments up front so Program Change recall is instant
+        log(TAG_CANDIDE, "Precompiling instruments...")
+        self.instrument_manager.precompile_instruments()
 
         # Set initial instrument
         log(TAG_CANDIDE, "Setting initial instrument...")
@@ -93,6 +144,7 @@ class Candide:
             # Start connection detection
             log(TAG_CANDIDE, "Checking for base station...")
             # Just check state - connection manager will handle detection in update loop
+            self.hardware_manager.poll_base_station()
             if self.hardware_manager.is_base_station_detected():
                 log(TAG_CANDIDE, "Base station detected during boot")
 
@@ -102,11 +154,15 @@ class Candide:
 
     def update(self):
         try:
+            self.telemetry.loop()
+            
             # Process any pending MIDI messages first
             if self.midi_interface:
                 self.midi_interface.process_midi_messages()
             
             # Then handle other updates
+            self.transport.update()
+            self.text_uart.process_commands()
             self.connection_manager.update_state()
             self.hardware_manager.check_encoder(self.instrument_manager)
             self.hardware_manager.check_volume(self.audio_system)
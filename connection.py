@@ -4,12 +4,43 @@ import time
 import sys
 from constants import (
     HEARTBEAT_INTERVAL,
+    HEARTBEAT_MESSAGE,
+    SENSING_INTERVAL,
     ConnectionState,
     DETECT_PIN,
-    DETECTION_RETRY_INTERVAL
+    DETECTION_RETRY_INTERVAL,
+    CAPS_QUERY,
+    CAPS_CC,
+    CAPS_TIMEOUT,
+    CAPS_BINARY_CONFIG,
+    CAPS_CONFIG_HASH,
+    CAPS_FAST_BAUD,
+    CAPS_ACTIVE_SENSING,
+    CAPS_FRAMED_TEXT,
+    CANDIDE_CAPS,
+    HANDSHAKE_CC,
+    CONFIG_HASH_PREFIX,
+    CONFIG_HASH_ACK,
+    CONFIG_HASH_NACK,
+    CONFIG_HASH_TIMEOUT,
+    UART_BAUDRATE,
+    UART_FAST_BAUDRATE,
+    BAUD_PREFIX,
+    BAUD_CHECK,
+    BAUD_ACK,
+    BAUD_TIMEOUT,
+    BAUD_ERROR_LIMIT
 )
 from logging import log, TAG_CONNECT
-from router import get_router
+from ticks import ticks_ms, ticks_diff, ticks_add
+from midi import MIDI_ACTIVE_SENSING
+from router import get_router, encode_cc_config
+
+def _earlier(deadline, candidate):
+    """Earliest of two monotonic deadlines, None meaning no deadline"""
+    if deadline is None or candidate < deadline:
+        return candidate
+    return deadline
 
 class ConnectionManager:
     def __init__(self, text_uart, midi_interface, hardware_manager):
@@ -24,12 +55,34 @@ class ConnectionManager:
         log(TAG_CONNECT, "Initializing state variables ...")
         self.state = ConnectionState.STANDALONE
         self.last_heartbeat_time = 0
+        self.heartbeat_interval = HEARTBEAT_INTERVAL
+        self._sensing_frame = bytes((MIDI_ACTIVE_SENSING,))
         self.last_detection_time = 0
+        self._deadline = ticks_ms()  # Tick the state machine next runs at, None waits for an edge
         self.last_config_time = 0  # Track when we last sent config
         self.config_retry_sent = False  # Track if we've done our one retry
         self._state_observers = []  # Observers for connection state
         self.instrument_manager = None  # Reference to instrument manager
         
+        # Capabilities agreed with the base station, 0 until it answers
+        self.peer_caps = 0
+        self.caps_pending = False
+        self.caps_query_time = 0
+        self.caps_subscription = None
+        
+        # Config offered by hash, waiting for the base station's answer
+        self.hash_pending = False
+        self.hash_query_time = 0
+        self.hash_subscription = None
+        self.pending_config = None
+        
+        # Link rate negotiation: None, 'offered', 'checking' or 'fast'
+        self.baud_state = None
+        self.baud_time = 0
+        self.baud_failed = False  # Stay at UART_BAUDRATE until reconnected
+        self.baud_errors = 0  # RX error count at the last check
+        self.baud_subscription = None
+        
         log(TAG_CONNECT, "Candide connection manager initialized")
 
     def set_instrument_manager(self, instrument_manager):
@@ -37,6 +90,9 @@ class ConnectionManager:
         self.instrument_manager = instrument_manager
         if self.instrument_manager:
             self.instrument_manager.set_connection_manager(self)
+            # Observe after the patcher so the router already holds the new instrument
+            self.instrument_manager.remove_observer(self)
+            self.instrument_manager.add_observer(self)
             # Register for instrument state changes
             if self.instrument_manager.state_machine:
                 self.instrument_manager.state_machine.set_connection_callback(self._on_instrument_state_change)
@@ -51,9 +107,20 @@ class ConnectionManager:
             self._state_observers.remove(observer)
 
     def update_state(self):
-        """Update connection state and notify observers of changes."""
-        is_detected = self.hardware.is_base_station_detected()  # Checks GP22
-        current_time = time.monotonic()
+        """Update connection state and notify observers of changes.
+        
+        Runs on a GP22 edge or once the next timer falls due, every other
+        call returns straight away.
+        """
+        edge = self.hardware.poll_base_station()
+        if not edge and (self._deadline is None or ticks_diff(ticks_ms(), self._deadline) < 0):
+            return
+        self._run_state(time.monotonic())
+        self._schedule()
+
+    def _run_state(self, current_time):
+        """Advance the state machine"""
+        is_detected = self.hardware.is_base_station_detected()  # Debounced GP22
         
         # Handle disconnection in any state
         if not is_detected:
@@ -61,6 +128,11 @@ class ConnectionManager:
                 self._handle_disconnection()
             return
             
+        # Fall back to the full config if a hash offer goes unanswered
+        if self.hash_pending and current_time - self.hash_query_time >= CONFIG_HASH_TIMEOUT:
+            log(TAG_CONNECT, "No config hash reply, sending full config")
+            self._send_full_config()
+            
         # Handle connection states
         if self.state == ConnectionState.STANDALONE:
             # Rate limit detection attempts
@@ -69,40 +141,74 @@ class ConnectionManager:
                 self.last_detection_time = current_time
                 
         elif self.state == ConnectionState.DETECTED:
-            # Check if we need to retry config
-            if (not self.config_retry_sent and 
-                current_time - self.last_config_time >= 1.0 and
-                self.instrument_manager and 
-                self.instrument_manager.state_machine and
-                not self.instrument_manager.state_machine.has_received_midi()):
-                log(TAG_CONNECT, "No MIDI received after 1s, retrying config...")
-                self.send_config()
+            # An older base station never answers the caps query
+            if self.caps_pending:
+                if current_time - self.caps_query_time >= CAPS_TIMEOUT:
+                    log(TAG_CONNECT, "No capability reply, using text config")
+                    self._finish_caps(0)
+                return
+                
+            # Check once, 1s after the config, if we need to retry it
+            if not self.config_retry_sent and current_time - self.last_config_time >= 1.0:
                 self.config_retry_sent = True
+                if (self.instrument_manager and 
+                    self.instrument_manager.state_machine and
+                    not self.instrument_manager.state_machine.has_received_midi()):
+                    log(TAG_CONNECT, "No MIDI received after 1s, retrying config...")
+                    self.send_config()
                 
         elif self.state == ConnectionState.CONNECTED:
+            if self.baud_state in ('offered', 'checking'):
+                if current_time - self.baud_time >= BAUD_TIMEOUT:
+                    log(TAG_CONNECT, f"No reply at {UART_FAST_BAUDRATE} baud, staying at {UART_BAUDRATE}")
+                    self._fall_back_baud(notify=False)
+                    
             # Send heartbeat if needed
-            if current_time - self.last_heartbeat_time >= HEARTBEAT_INTERVAL:
+            if current_time - self.last_heartbeat_time >= self.heartbeat_interval:
+                if self.baud_state == 'fast':
+                    self._check_link_errors()
                 self._send_heartbeat()
 
-    def _send_message(self, message, is_heartbeat=False):
+    def _schedule(self):
+        """Set the tick of the earliest pending timer, None if only an edge can change anything"""
+        deadline = None
+        if self.hash_pending:
+            deadline = self.hash_query_time + CONFIG_HASH_TIMEOUT
+            
+        if self.state == ConnectionState.STANDALONE:
+            if self.hardware.is_base_station_detected():
+                deadline = _earlier(deadline, self.last_detection_time + DETECTION_RETRY_INTERVAL)
+        elif self.state == ConnectionState.DETECTED:
+            if self.caps_pending:
+                deadline = _earlier(deadline, self.caps_query_time + CAPS_TIMEOUT)
+            elif not self.config_retry_sent:
+                deadline = _earlier(deadline, self.last_config_time + 1.0)
+        elif self.state == ConnectionState.CONNECTED:
+            if self.baud_state in ('offered', 'checking'):
+                deadline = _earlier(deadline, self.baud_time + BAUD_TIMEOUT)
+            deadline = _earlier(deadline, self.last_heartbeat_time + self.heartbeat_interval)
+            
+        if deadline is None:
+            self._deadline = None
+        else:
+            delay = max(0, int((deadline - time.monotonic()) * 1000))
+            self._deadline = ticks_add(ticks_ms(), delay)
+
+    def _wake(self):
+        """Run the state machine on the next update, a timer started outside it"""
+        self._deadline = ticks_ms()
+
+    def _send_message(self, message):
         """Send complete message with newline."""
         try:
-            # Only log non-heartbeat messages
-            if not is_heartbeat:
-                log(TAG_CONNECT, f"UART TX: {message}")
+            log(TAG_CONNECT, f"UART TX: {message}")
                 
             # Ensure message ends with newline
             if not message.endswith('\n'):
                 message += '\n'
                 
-            # Send complete message
-            self.uart.write(message)
-            
-            # Only update heartbeat time for regular heartbeats
-            if is_heartbeat and message == "♡\n":
-                self.last_heartbeat_time = time.monotonic()
-                
-            return True
+            # Queue complete message
+            return self.uart.write(message) > 0
             
         except Exception as e:
             log(TAG_CONNECT, f"Failed to send message: {str(e)}", is_error=True)
@@ -112,31 +218,192 @@ class ConnectionManager:
         """Send CC configuration to Bartleby. Can be called by:
         1. Initial detection (_handle_initial_detection)
         2. Instrument changes"""
+        config = get_router().get_cc_config()
+        if self.peer_caps & CAPS_CONFIG_HASH:
+            return self._offer_config_hash(config)
+        return self._send_full_config(config)
+
+    def _offer_config_hash(self, config):
+        """Offer the config by hash, the base station confirms or asks for it"""
+        self.pending_config = config
+        self.hash_pending = True
+        self.hash_query_time = time.monotonic()
+        self.last_config_time = self.hash_query_time
+        self._wake()
+        if not self.hash_subscription:
+            self.hash_subscription = self.midi.subscribe(
+                self._handle_config_hash_reply,
+                message_types=['cc'],
+                cc_numbers={HANDSHAKE_CC}
+            )
+        return self._send_message(f"{CONFIG_HASH_PREFIX}{config['hash']:08x}")
+
+    def _handle_config_hash_reply(self, msg):
+        """Base station answer to a config hash offer"""
+        if not self.hash_pending:
+            return
+        if msg.value == CONFIG_HASH_ACK:
+            config = self._end_hash_offer()
+            log(TAG_CONNECT, f"Config hash {config['hash']:08x} confirmed")
+            self.last_config_time = time.monotonic()
+            self._wake()
+            if self.instrument_manager and self.instrument_manager.state_machine:
+                self.instrument_manager.state_machine.on_config_confirmed(config['data'], self.midi)
+        elif msg.value == CONFIG_HASH_NACK:
+            log(TAG_CONNECT, "Config hash unknown, sending full config")
+            self._send_full_config()
+
+    def _end_hash_offer(self):
+        """Stop waiting for a hash reply, returns the offered config"""
+        config = self.pending_config
+        self.pending_config = None
+        self.hash_pending = False
+        if self.hash_subscription:
+            self.midi.unsubscribe(self.hash_subscription)
+            self.hash_subscription = None
+        return config
+
+    def _send_full_config(self, config=None):
+        """Send the whole config, binary if negotiated"""
+        if self.hash_pending:
+            config = self._end_hash_offer()
+        if config is None:
+            config = get_router().get_cc_config()
         try:
-            # Get config from router service
-            config_string = get_router().get_cc_configs()
+            config_data = config['data']
             
-            if not config_string or config_string == "Candide|cc|":
-                # Send blank CC config when no mappings exist
-                config_string = "cc|"
-                log(TAG_CONNECT, "Preparing blank config")
+            if self.peer_caps & CAPS_BINARY_CONFIG:
+                frame = encode_cc_config(config_data)
+                log(TAG_CONNECT, f"Preparing binary config: {len(frame)} bytes, {len(config_data['pots'])} pots")
+                sent = self.uart.write_bytes(frame) > 0
             else:
-                log(TAG_CONNECT, f"Preparing config string: {config_string}")
+                if not config_data['pots']:
+                    # Send blank CC config when no mappings exist
+                    config_string = "cc|"
+                    log(TAG_CONNECT, "Preparing blank config")
+                else:
+                    config_string = config['text']
+                    log(TAG_CONNECT, f"Preparing config string: {config_string}")
+                sent = self._send_message(config_string)
             
-            # Send config
-            if self._send_message(config_string):
+            if sent:
                 # Update timing for retry logic
                 self.last_config_time = time.monotonic()
+                self._wake()
                 
                 # Notify instrument state machine
                 if self.instrument_manager and self.instrument_manager.state_machine:
-                    self.instrument_manager.state_machine.on_config_sent(config_string, self.midi)
+                    self.instrument_manager.state_machine.on_config_sent(config_data, self.midi)
                 return True
                 
         except Exception as e:
             log(TAG_CONNECT, f"Failed to send config: {str(e)}", is_error=True)
         return False
 
+    def _query_caps(self):
+        """Ask the base station which protocol extensions it supports"""
+        self.peer_caps = 0
+        self.caps_pending = True
+        self.uart.transport.text_framed = False
+        self.caps_query_time = time.monotonic()
+        self._wake()
+        if not self.caps_subscription:
+            self.caps_subscription = self.midi.subscribe(
+                self._handle_caps,
+                message_types=['cc'],
+                cc_numbers={CAPS_CC}
+            )
+        self._send_message(CAPS_QUERY)
+
+    def _handle_caps(self, msg):
+        """Capability reply from the base station"""
+        if self.caps_pending:
+            log(TAG_CONNECT, f"Base station capabilities: {msg.value:#04x}")
+            self._finish_caps(msg.value)
+
+    def _finish_caps(self, caps):
+        """Settle on shared capabilities and send the config"""
+        self.peer_caps = caps & CANDIDE_CAPS
+        self.caps_pending = False
+        if self.peer_caps & CAPS_ACTIVE_SENSING:
+            self.heartbeat_interval = SENSING_INTERVAL
+        # Framed text is what lets MIDI thru share the TX
+        self.uart.transport.text_framed = bool(self.peer_caps & CAPS_FRAMED_TEXT)
+        if self.caps_subscription:
+            self.midi.unsubscribe(self.caps_subscription)
+            self.caps_subscription = None
+        self.send_config()
+
+    def _offer_fast_baud(self):
+        """Ask the base station to move the link to UART_FAST_BAUDRATE"""
+        if (not (self.peer_caps & CAPS_FAST_BAUD) or self.baud_failed or
+                self.baud_state is not None):
+            return
+        self.baud_state = 'offered'
+        self.baud_time = time.monotonic()
+        self._wake()
+        if not self.baud_subscription:
+            self.baud_subscription = self.midi.subscribe(
+                self._handle_baud_reply,
+                message_types=['cc'],
+                cc_numbers={HANDSHAKE_CC}
+            )
+        self._send_message(f"{BAUD_PREFIX}{UART_FAST_BAUDRATE}")
+
+    def _handle_baud_reply(self, msg):
+        """Base station ack, first at the old rate then at the new one"""
+        if msg.value != BAUD_ACK:
+            return
+        if self.baud_state == 'offered':
+            # The base station switches right after acking
+            self.uart.transport.set_baudrate(UART_FAST_BAUDRATE)
+            self.baud_state = 'checking'
+            self.baud_time = time.monotonic()
+            self._wake()
+            self._send_message(BAUD_CHECK)
+        elif self.baud_state == 'checking':
+            log(TAG_CONNECT, f"Link running at {UART_FAST_BAUDRATE} baud")
+            self.baud_state = 'fast'
+            self.baud_errors = self._link_errors()
+            self._end_baud_negotiation()
+
+    def _end_baud_negotiation(self):
+        """Stop listening for baud acks"""
+        if self.baud_subscription:
+            self.midi.unsubscribe(self.baud_subscription)
+            self.baud_subscription = None
+
+    def _link_errors(self):
+        """Running count of RX errors that point at a bad link"""
+        health = self.midi.get_rx_health()
+        return health['resyncs'] + health['overflows']
+
+    def _check_link_errors(self):
+        """Drop back to the standard rate if errors pile up at the fast one"""
+        errors = self._link_errors()
+        if errors - self.baud_errors > BAUD_ERROR_LIMIT:
+            log(TAG_CONNECT, f"{errors - self.baud_errors} RX errors at {UART_FAST_BAUDRATE} baud, "
+                f"falling back to {UART_BAUDRATE}", is_error=True)
+            self._fall_back_baud()
+        else:
+            self.baud_errors = errors
+
+    def _fall_back_baud(self, notify=True):
+        """Return to UART_BAUDRATE and don't try again this connection"""
+        if notify and self.uart:
+            # Tell the base station while it can still hear us
+            self._send_message(f"{BAUD_PREFIX}{UART_BAUDRATE}")
+        self._end_baud_negotiation()
+        self.baud_state = None
+        self.baud_failed = True
+        if self.uart:
+            self.uart.transport.set_baudrate(UART_BAUDRATE)
+
+    def on_instrument_change(self, instrument_name, config_name, paths):
+        """Send the new instrument's config to a base station already talking to us"""
+        if self.state != ConnectionState.STANDALONE and not self.caps_pending:
+            self.send_config()
+
     def _notify_state_change(self, new_state):
         """Notify observers of connection state change."""
         for observer in self._state_observers:
@@ -147,7 +414,9 @@ class ConnectionManager:
         if self.state != ConnectionState.CONNECTED:
             log(TAG_CONNECT, "[STATE] -> CONNECTED: Starting heartbeat")
             self.state = ConnectionState.CONNECTED
+            self._wake()
             self._notify_state_change(ConnectionState.CONNECTED)
+            self._offer_fast_baud()
 
     def _handle_initial_detection(self):
         """Handle initial base station detection."""
@@ -159,8 +428,10 @@ class ConnectionManager:
             # Reset retry flag for new connection
             self.config_retry_sent = False
             
-            # Send config but don't transition yet - wait for instrument state
-            self.send_config()
+            # Negotiate first, the config goes out once the base station
+            # answers or the query times out. Don't transition yet - wait
+            # for instrument state
+            self._query_caps()
         
     def _handle_disconnection(self):
         """Handle base station disconnection."""
@@ -168,7 +439,21 @@ class ConnectionManager:
         old_state = self.state
         self.state = ConnectionState.STANDALONE
         self.last_heartbeat_time = 0
+        self.heartbeat_interval = HEARTBEAT_INTERVAL
         self.config_retry_sent = False  # Reset retry flag
+        self.peer_caps = 0
+        self.caps_pending = False
+        self.uart.transport.text_framed = False
+        if self.caps_subscription:
+            self.midi.unsubscribe(self.caps_subscription)
+            self.caps_subscription = None
+        if self.hash_pending:
+            self._end_hash_offer()
+        # A new base station starts at the standard rate
+        self._end_baud_negotiation()
+        self.baud_state = None
+        self.baud_failed = False
+        self.uart.transport.set_baudrate(UART_BAUDRATE)
         
         # Reset instrument state machine
         if self.instrument_manager and self.instrument_manager.state_machine:
@@ -178,11 +463,29 @@ class ConnectionManager:
             self._notify_state_change(ConnectionState.STANDALONE)
             
     def _send_heartbeat(self):
-        """Send heartbeat if still connected."""
+        """Send heartbeat unless other traffic just showed the link is alive."""
         # Only send heartbeat if still detected
-        if self.hardware.is_base_station_detected():
-            if self._send_message("♡", is_heartbeat=True):
-                log(TAG_CONNECT, "♡", is_heartbeat=True)
+        if not self.hardware.is_base_station_detected():
+            return
+        now = time.monotonic()
+        transport = self.uart.transport
+        if transport.tx_pending:
+            # Queued traffic counts, the next heartbeat is due an interval after it
+            self.last_heartbeat_time = now
+            return
+        if transport.tx_bytes_total:
+            idle = ticks_diff(ticks_ms(), transport.last_tx_time) / 1000
+            if idle < self.heartbeat_interval:
+                self.last_heartbeat_time = now - idle
+                return
+                
+        if self.peer_caps & CAPS_ACTIVE_SENSING:
+            sent = self.uart.write_bytes(self._sensing_frame, low_priority=True)
+        else:
+            sent = self.uart.write_heartbeat()
+        if sent:
+            self.last_heartbeat_time = now
+            log(TAG_CONNECT, HEARTBEAT_MESSAGE, is_heartbeat=True)
 
     def _on_instrument_state_change(self, new_state):
         """Handle instrument state changes."""
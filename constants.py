@@ -15,6 +15,7 @@ MAX_BUFFER_FULLNESS = 0.8
 MIN_BUFFER_FULLNESS = 0.2
 AUDIO_CHANNEL_COUNT = 2
 MAX_NOTES= 12
+INSTRUMENT_CACHE_SIZE = 8  # Compiled instruments kept for instant recall
 
 I2S_BIT_CLOCK = board.GP1
 I2S_WORD_SELECT = board.GP2
@@ -33,20 +34,81 @@ UART_TX = board.GP16
 UART_RX = board.GP17
 UART_BAUDRATE = 31250
 UART_TIMEOUT = 0.001
+UART_RX_BUFFER_SIZE = 512  # ~160ms of input at 31250 baud before bytes are lost
+UART_TX_BUFFER_SIZE = 256  # TX ring, drained a little every update
+UART_TX_CHUNK_SIZE = 32    # Max bytes handed to the UART per update (RP2040 FIFO depth)
 MIDI_BAUDRATE = 31250
+MIDI_BULK_RX = True         # Drain all pending RX bytes per update instead of byte-by-byte reads
+MIDI_RX_BUFFER_SIZE = 64    # Preallocated RX chunk size for bulk reads
+MIDI_COALESCE = True        # Collapse continuous messages per channel/controller within one update
+MIDI_EVENT_QUEUE_SIZE = 64  # Events per priority ring between RX and dispatch
+MIDI_EVENT_BUDGET = 48      # Max events dispatched per update, the rest carry over
+MIDI_TIME_BUDGET_MS = 4     # Max ms per update spent on MIDI before deferring
+MIDI_SYSEX_BUFFER_SIZE = 128  # Max SysEx payload bytes, larger frames are dropped
+MIDI_USB_INPUT = True       # Merge USB MIDI input with the UART stream when available
+MIDI_USB_MAX_CHUNKS = 4     # USB RX chunks read per update, the host waits on the rest
+MIDI_CAPTURE = False        # Record raw RX bytes with timestamps for later dump/replay
+MIDI_CAPTURE_SIZE = 1024    # Captured bytes kept, oldest are overwritten
+MIDI_CAPTURE_CHUNKS = 128   # Timestamped reads kept
+MIDI_SENSING_TIMEOUT_MS = 300  # Silence after Active Sensing that releases all notes
+MIDI_THRU = False           # Forward received channel and realtime messages to the UART TX
 
 SETUP_DELAY = 0.1
 
 DETECT_PIN = board.GP22
+DETECT_DEBOUNCE = 0.02      # Seconds GP22 must hold a level before it counts as an edge
 MESSAGE_TIMEOUT = 0.05
+TEXT_FRAME_START = b'\xf4'  # Starts an incoming text line on the shared UART (undefined in MIDI)
+TEXT_FRAME_END = b'\n'
+TEXT_LINE_MAX = 128         # Longest incoming text line, longer lines are dropped
+TEXT_LINE_SLOTS = 4         # Complete lines held until read, oldest dropped first
 HELLO_INTERVAL = 0.5
 HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_MESSAGE = "♡"
+SENSING_INTERVAL = 0.25     # Active Sensing heartbeat period, under the 300ms MIDI limit
 HANDSHAKE_TIMEOUT = 5.0
 HANDSHAKE_MAX_RETRIES = 10
 HANDSHAKE_CC = 119
 HANDSHAKE_VALUE = 42
 WELCOME_VALUE = 43
 
+# Capability negotiation: Candide sends CAPS_QUERY as text on detection,
+# a base station that knows it answers with CAPS_CC whose value holds the
+# capability bits it supports. No answer within CAPS_TIMEOUT means none.
+CAPS_QUERY = "caps?"
+CAPS_CC = 118
+CAPS_TIMEOUT = 0.25
+CAPS_BINARY_CONFIG = 0x01   # Config sent as a SysEx frame instead of text
+CAPS_CONFIG_HASH = 0x02     # Config hash offered first, full config only if unknown
+CAPS_FAST_BAUD = 0x04       # Link can move to UART_FAST_BAUDRATE once connected
+CAPS_ACTIVE_SENSING = 0x08  # Heartbeat as MIDI Active Sensing (0xFE) instead of text
+CAPS_FRAMED_TEXT = 0x10     # Outgoing text framed like incoming, so MIDI thru can share the TX
+CANDIDE_CAPS = (CAPS_BINARY_CONFIG | CAPS_CONFIG_HASH | CAPS_FAST_BAUD |
+                CAPS_ACTIVE_SENSING | CAPS_FRAMED_TEXT)
+
+# Config hash exchange: Candide sends CONFIG_HASH_PREFIX + 8 hex digits,
+# the base station answers on HANDSHAKE_CC
+CONFIG_HASH_PREFIX = "cfg#"
+CONFIG_HASH_ACK = 44        # Base station already has this config
+CONFIG_HASH_NACK = 45       # Unknown config, send it in full
+CONFIG_HASH_TIMEOUT = 0.25
+
+# Link rate negotiation once connected: Candide sends BAUD_PREFIX + rate,
+# the base station acks on HANDSHAKE_CC and both ends switch. Candide then
+# sends BAUD_CHECK at the new rate and expects the ack again; either side
+# returns to UART_BAUDRATE if that doesn't happen within BAUD_TIMEOUT.
+UART_FAST_BAUDRATE = 250000
+BAUD_PREFIX = "baud="
+BAUD_CHECK = "baud?"
+BAUD_ACK = 46
+BAUD_TIMEOUT = 0.25
+BAUD_ERROR_LIMIT = 8        # RX errors per heartbeat interval before falling back
+
+# Telemetry: a STATS_QUERY line is answered with STATS_PREFIX followed by
+# key=value counters separated by '|'
+STATS_QUERY = "stats?"
+STATS_PREFIX = "stats|"
+
 STARTUP_DELAY = 1.0
 RETRY_DELAY = 5.0
 RETRY_INTERVAL = 0.25
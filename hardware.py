@@ -3,7 +3,7 @@
 import board
 import analogio
 import rotaryio
-import digitalio
+import keypad
 import time
 import synthio
 import sys
@@ -182,54 +182,47 @@ class EncoderManager(HardwareComponent):
         return events
 
 class DetectPinManager:
-    def __init__(self, pin, log_interval=5):
+    def __init__(self, pin, debounce=DETECT_DEBOUNCE):
         """
         Initialize the DetectPinManager.
         
         :param pin: The GPIO pin to monitor.
-        :param log_interval: Time interval (in seconds) for periodic logging.
+        :param debounce: Time (in seconds) the pin must hold a level to count.
         """
         log(TAG_HARD, "Initializing detection pin...")
         
-        # Set up the pin
-        self.detect_pin = digitalio.DigitalInOut(pin)
-        self.detect_pin.direction = digitalio.Direction.INPUT
-        self.detect_pin.pull = digitalio.Pull.DOWN  # Use internal pull-down resistor
+        # keypad scans and debounces the pin in the background and queues
+        # edges, HIGH is "pressed" with the internal pull-down enabled
+        self.keys = keypad.Keys((pin,), value_when_pressed=True, pull=True,
+                                interval=debounce, max_events=4)
+        self._event = keypad.Event()  # Reused for every edge
         
-        # Initialize state tracking
-        self.last_state = self.detect_pin.value
-        self.last_log_time = time.monotonic()
-        self.log_interval = log_interval  # Log periodically
+        # Starts LOW, a pin already HIGH shows up as an edge on the first scan
+        self.detected = False
         
-        # Initial log for verification
-        log(TAG_HARD, f"Detection pin initialized (initial state: {'HIGH' if self.last_state else 'LOW'})")
+        log(TAG_HARD, f"Detection pin initialized (debounce {debounce * 1000:.0f}ms)")
 
-    def is_detected(self):
+    def poll(self):
         """
-        Check the pin state (HIGH or LOW) and log changes.
+        Apply queued edges and log changes.
         
-        :return: True if HIGH (connected), False if LOW (disconnected).
+        :return: True if the detected state changed since the last poll.
         """
-        current_state = self.detect_pin.value
-        
-        # Log state changes
-        if current_state != self.last_state:
-            log(TAG_HARD, f"State changed: {'HIGH' if current_state else 'LOW'}")
-            self.last_state = current_state
-        
-        # Periodic logging for monitoring
-        current_time = time.monotonic()
-        if current_time - self.last_log_time >= self.log_interval:
-            self.last_log_time = current_time
-        
-        return current_state
+        changed = False
+        while self.keys.events.get_into(self._event):
+            if self._event.pressed != self.detected:
+                self.detected = self._event.pressed
+                changed = True
+                log(TAG_HARD, f"State changed: {'HIGH' if self.detected else 'LOW'}")
+        return changed
 
     def cleanup(self):
         """
         Deinitialize the pin safely.
         """
-        if self.detect_pin:
-            self.detect_pin.deinit()
+        if self.keys:
+            self.keys.deinit()
+            self.keys = None
             log(TAG_HARD, "Detection pin deinitialized.")
 
 class HardwareManager:
@@ -281,9 +274,16 @@ class HardwareManager:
             return self.volume.read()
         return None
 
+    def poll_base_station(self):
+        """Apply debounced GP22 edges, True if detection changed."""
+        if self.detect:
+            return self.detect.poll()
+        return False
+
     def is_base_station_detected(self):
+        """Debounced GP22 state as of the last poll."""
         if self.detect:
-            return self.detect.is_detected()
+            return self.detect.detected
         return False
 
     def check_volume(self, audio_system):
@@ -392,8 +392,13 @@ class InstrumentStateMachine:
         """Set callback for connection state changes."""
         self.connection_callback = callback
         
-    def on_config_sent(self, config_string, midi_interface):
-        """Called when a new config is sent."""
+    def on_config_sent(self, config_data, midi_interface):
+        """Called when a new config is sent.
+        
+        Args:
+            config_data: Structured config from Router.get_cc_config_data
+            midi_interface: Interface to watch for pot values on
+        """
         self.state = 'changing'
         log(TAG_INST, "Instrument state: changing")
         self.received_pots.clear()
@@ -406,7 +411,7 @@ class InstrumentStateMachine:
             self.midi_interface.unsubscribe(self.midi_subscription)
             self.midi_subscription = None
         
-        if not config_string or config_string == "cc|":
+        if not config_data or not config_data['pots']:
             # Empty config - wait for CC127:0
             self.waiting_for_cc127 = True
             self.expected_pots.clear()
@@ -417,27 +422,35 @@ class InstrumentStateMachine:
                 cc_numbers={127}
             )
         else:
-            # Parse config string to get expected pots
+            # Expected pots come straight from the structured config
             self.waiting_for_cc127 = False
             self.expected_pots = set()
-            parts = config_string.split('|')
-            if len(parts) > 3:  # Has pot mappings
-                for mapping in parts[3:]:
-                    if '=' in mapping:
-                        pot_num = int(mapping.split('=')[0])
-                        cc_num = int(mapping.split('=')[1].split(':')[0])
-                        self.expected_pots.add(pot_num)
-                        self.pot_to_cc_map[cc_num] = pot_num
-                # Subscribe to mapped CCs
-                cc_numbers = set(self.pot_to_cc_map.keys())
-                self.midi_subscription = midi_interface.subscribe(
-                    self._handle_midi_message,
-                    message_types=['cc'],
-                    cc_numbers=cc_numbers
-                )
-                log(TAG_INST, f"Waiting for pots: {self.expected_pots}")
-                log(TAG_INST, f"CC to pot mapping: {self.pot_to_cc_map}")
+            for pot_num, cc_num, _ in config_data['pots']:
+                self.expected_pots.add(pot_num)
+                self.pot_to_cc_map[cc_num] = pot_num
+            # Subscribe to mapped CCs
+            cc_numbers = set(self.pot_to_cc_map.keys())
+            self.midi_subscription = midi_interface.subscribe(
+                self._handle_midi_message,
+                message_types=['cc'],
+                cc_numbers=cc_numbers
+            )
+            log(TAG_INST, f"Waiting for pots: {self.expected_pots}")
+            log(TAG_INST, f"CC to pot mapping: {self.pot_to_cc_map}")
     
+    def on_config_confirmed(self, config_data, midi_interface):
+        """Called when the base station already has the config by hash.
+        
+        It keeps its pot values, so there is no round-trip to wait for.
+        """
+        self.midi_interface = midi_interface
+        self.received_pots.clear()
+        self.expected_pots.clear()
+        self.pot_to_cc_map.clear()
+        self.waiting_for_cc127 = False
+        log(TAG_INST, f"Config confirmed by hash: {config_data['name']}")
+        self._complete_change()
+
     def _handle_midi_message(self, msg):
         """Handle MIDI CC messages while in changing state."""
         if self.state == 'changing' and msg.type == 'cc':
@@ -506,6 +519,8 @@ class InstrumentManager:
         self._observers = []  # List of observers for instrument changes
         self.current_cc_config = None  # Cache for current CC config
         self.state_machine = None  # Set when connection manager is available
+        self.midi_interface = None  # Set for Program Change recall
+        self.program_subscription = None
         self._discover_instruments()
         log(TAG_INST, "Instrument manager initialized")
 
@@ -513,6 +528,37 @@ class InstrumentManager:
         """Set connection manager and initialize state machine."""
         self.state_machine = InstrumentStateMachine(connection_manager)
 
+    def set_midi_interface(self, midi_interface):
+        """Subscribe to Program Change messages for instrument recall."""
+        if self.program_subscription and self.midi_interface:
+            self.midi_interface.unsubscribe(self.program_subscription)
+        self.midi_interface = midi_interface
+        self.program_subscription = midi_interface.subscribe(
+            self._handle_program_change,
+            message_types=['program_change']
+        )
+
+    def _handle_program_change(self, msg):
+        """Map Program Change number to instrument order index."""
+        if msg.program >= len(self.instrument_order):
+            log(TAG_INST, f"No instrument for program {msg.program}")
+            return
+        instrument_name = self.instrument_order[msg.program]
+        if instrument_name != self.current_instrument:
+            log(TAG_INST, f"Program change {msg.program} -> {instrument_name}")
+            self.set_instrument(instrument_name)
+
+    def precompile_instruments(self):
+        """Compile all instruments ahead of time so switches skip path parsing."""
+        router = get_router()
+        for instrument_name in self.instrument_order:
+            config_name, paths = self.instruments[instrument_name]
+            try:
+                router.precompile(paths, config_name)
+            except Exception as e:
+                log(TAG_INST, f"Failed to precompile {instrument_name}: {str(e)}", is_error=True)
+        log(TAG_INST, "Instruments precompiled")
+
     def add_observer(self, observer):
         """Add an observer to be notified of instrument changes."""
         self._observers.append(observer)
@@ -606,6 +652,9 @@ class InstrumentManager:
         log(TAG_INST, "Cleaning up instrument manager")
         self._observers.clear()
         self.current_cc_config = None
+        if self.program_subscription and self.midi_interface:
+            self.midi_interface.unsubscribe(self.program_subscription)
+            self.program_subscription = None
         if self.state_machine and self.state_machine.midi_subscription:
             self.state_machine.midi_interface.unsubscribe(self.state_machine.midi_subscription)
         self.state_machine = None
@@ -1,7 +1,14 @@
 """MIDI interface system providing MIDI message handling and MPE support with filtering."""
 
-import supervisor
-from constants import MidiMessageType
+import array
+from ticks import ticks_ms, ticks_diff
+from constants import (
+    MidiMessageType, MIDI_BULK_RX, MIDI_RX_BUFFER_SIZE, MIDI_COALESCE,
+    MIDI_EVENT_QUEUE_SIZE, MIDI_EVENT_BUDGET, MIDI_TIME_BUDGET_MS,
+    MIDI_SYSEX_BUFFER_SIZE, MIDI_USB_INPUT, MIDI_USB_MAX_CHUNKS,
+    MIDI_CAPTURE, MIDI_CAPTURE_SIZE, MIDI_CAPTURE_CHUNKS,
+    MIDI_SENSING_TIMEOUT_MS, MIDI_THRU
+)
 from logging import log, TAG_MIDI, LOG_ENABLE
 
 # MIDI Message Types
@@ -9,86 +16,201 @@ MIDI_NOTE_OFF = 0x80          # Note Off
 MIDI_NOTE_ON = 0x90           # Note On
 MIDI_POLY_PRESSURE = 0xA0     # Polyphonic Key Pressure
 MIDI_CONTROL_CHANGE = 0xB0    # Control Change
+MIDI_PROGRAM_CHANGE = 0xC0    # Program Change
 MIDI_CHANNEL_PRESSURE = 0xD0  # Channel Pressure
 MIDI_PITCH_BEND = 0xE0        # Pitch Bend
 MIDI_SYSTEM_MESSAGE = 0xF0    # System Message
+MIDI_SYSEX_START = 0xF0       # System Exclusive
+MIDI_SYSEX_END = 0xF7         # End of Exclusive
+MIDI_ACTIVE_SENSING = 0xFE    # Realtime keepalive
+
+# Thru filter bits per message type, channel voice types follow the status nibble
+MIDI_THRU_TYPE_BITS = {
+    'note_off': 0x01,
+    'note_on': 0x02,
+    'poly_pressure': 0x04,
+    'cc': 0x08,
+    'program_change': 0x10,
+    'channel_pressure': 0x20,
+    'pitch_bend': 0x40,
+    'realtime': 0x80
+}
+MIDI_THRU_REALTIME = 0x80
 
 # MPE Configuration
 MPE_LOWER_ZONE_MASTER = 0  # Channel 1
 MPE_UPPER_ZONE_MASTER = 15  # Channel 16
 MPE_TIMBRE_CC = 74
 
+# Channel mode controllers handled as 'channel_mode' messages (CC127 stays a
+# plain CC, the base station handshake uses it)
+MIDI_ALL_SOUND_OFF = 120
+MIDI_RESET_ALL_CONTROLLERS = 121
+MIDI_ALL_NOTES_OFF = 123
+MIDI_CHANNEL_MODE_CCS = (MIDI_ALL_SOUND_OFF, MIDI_RESET_ALL_CONTROLLERS, MIDI_ALL_NOTES_OFF)
+
+# Controllers that carry a continuous value, where only the latest one per
+# update matters: modulation, breath, foot, volume, balance, pan, expression
+# and the sound controllers (74 is MPE timbre). Bank select, data entry,
+# RPN/NRPN numbers and switches are sequences or states and are never held.
+MIDI_CONTINUOUS_CCS = (1, 2, 4, 7, 8, 10, 11, 71, 72, 73, 74, 75, 76, 77, 78, 79)
+
+# Message types that subscriptions can be indexed on
+MIDI_MESSAGE_TYPES = ('note_on', 'note_off', 'cc', 'channel_mode', 'program_change', 'channel_pressure', 'pitch_bend')
+
+# Data bytes per channel message, indexed by (status >> 4) - 8
+MIDI_DATA_LENGTHS = bytes((2, 2, 2, 2, 1, 1, 2))
+
+# Data bytes following system common status, indexed by status - 0xF0
+MIDI_SYSTEM_DATA_LENGTHS = bytes((0, 1, 2, 1, 0, 0, 0, 0))
+
+# Number of recycled message objects handed to subscribers
+MIDI_MESSAGE_POOL_SIZE = 4
+
 # MPE Filtering Configuration
 MPE_FILTER_CONFIG = {
-    'pitch_bend_ratio': 1,    # Allow 1 in X messages through (0 means filter all)
-    'pressure_ratio': 1,      # Allow 1 in X messages through (0 means filter all)
-    'timbre_ratio': 0,        # Allow 1 in X messages through (0 means filter all)
+    'pitch_bend_rate': None,  # Messages/sec per channel (0 filters all, None is unlimited)
+    'pressure_rate': None,    # Messages/sec per channel (0 filters all, None is unlimited)
+    'timbre_rate': 0,         # Messages/sec per channel (0 filters all, None is unlimited)
+    'burst_ms': 50,           # Bucket depth, in milliseconds of budget
+    'loop_target_ms': 10,     # Main loop latency above this tightens all budgets
+    'min_budget_percent': 10, # Budgets never shrink below this share
     'pitch_bend_threshold': 64,  # ~1% of total range (0-16383)
     'pressure_threshold': 4,     # ~3% of total range (0-127)
     'timbre_threshold': 4        # ~3% of total range (0-127)
 }
 
+# Rate limited MPE dimensions, index order used by the token buckets
+MPE_DIMENSIONS = ('pitch_bend', 'pressure', 'timbre')
+MPE_DIMENSION_INDEX = {'pitch_bend': 0, 'channel_pressure': 1, 'cc': 2}
+
 class MPEMessageCounter:
-    """Tracks MPE message counts globally and per channel"""
-    def __init__(self):
-        self.positions = {'pitch_bend': 0, 'pressure': 0, 'timbre': 0}
+    """Per-channel, per-dimension token bucket limiter with message statistics.
+    
+    Buckets hold milli-tokens and refill lazily from the tick of the current
+    update pass, so each message costs a few integer operations. now seeds
+    the clock, e.g. with the first tick of a replayed capture.
+    """
+    def __init__(self, now=None):
+        buckets = 16 * len(MPE_DIMENSIONS)
+        self.tokens = array.array('l', [0] * buckets)
+        self.last_refill = array.array('l', [0] * buckets)
+        self.rates = array.array('l', [0] * len(MPE_DIMENSIONS))  # Milli-tokens per ms after scaling
+        self.capacities = array.array('l', [0] * len(MPE_DIMENSIONS))  # Bucket depth in milli-tokens
+        self.refill_ms = array.array('l', [0] * len(MPE_DIMENSIONS))  # Idle time that fills a bucket
+        # Configured rates read per message: -1 unlimited (None), 0 filters all
+        self.configured = array.array('l', [0] * len(MPE_DIMENSIONS))
+        for dim in range(len(MPE_DIMENSIONS)):
+            rate = MPE_FILTER_CONFIG[MPE_DIMENSIONS[dim] + '_rate']
+            self.configured[dim] = -1 if rate is None else rate
+        self.now = ticks_ms() if now is None else now
+        self.last_update = self.now
+        self.loop_latency_ms = 0  # Smoothed main loop period
+        self.budget_percent = 100
+        self._apply_budget()
+        for i in range(buckets):
+            self.tokens[i] = self.capacities[i % len(MPE_DIMENSIONS)]
+            self.last_refill[i] = self.now
         self.reset_counters()
         
     def reset_counters(self):
         """Reset all message counters"""
-        self.channel_messages = {}
-        for ch in range(16):
-            self.channel_messages[ch] = {
-                'allowed': {'pitch_bend': 0, 'pressure': 0, 'timbre': 0},
-                'filtered': {'pitch_bend': 0, 'pressure': 0, 'timbre': 0}
-            }
+        # Indexed by channel * len(MPE_DIMENSIONS) + dimension
+        self.allowed = array.array('L', [0] * (16 * len(MPE_DIMENSIONS)))
+        self.filtered = array.array('L', [0] * (16 * len(MPE_DIMENSIONS)))
+            
+    def _apply_budget(self):
+        """Scale configured rates by the current budget share"""
+        for dim in range(len(MPE_DIMENSIONS)):
+            rate = self.configured[dim]
+            if rate > 0:
+                # msgs/sec equals milli-tokens per ms
+                self.rates[dim] = max(1, rate * self.budget_percent // 100)
+            else:
+                self.rates[dim] = 0
+            # At least one message deep
+            self.capacities[dim] = max(1000, self.rates[dim] * MPE_FILTER_CONFIG['burst_ms'])
+            self.refill_ms[dim] = self.capacities[dim] // max(1, self.rates[dim]) + 1
+                
+    def update(self, now):
+        """Called once per update pass with the current tick.
+        
+        The time between passes is the main loop latency, when it exceeds
+        the target all budgets shrink proportionally.
+        """
+        elapsed = ticks_diff(now, self.last_update)
+        self.last_update = now
+        self.now = now
+        self.loop_latency_ms = (self.loop_latency_ms * 7 + elapsed) // 8
+        
+        target = MPE_FILTER_CONFIG['loop_target_ms']
+        if self.loop_latency_ms > target:
+            percent = max(MPE_FILTER_CONFIG['min_budget_percent'], target * 100 // self.loop_latency_ms)
+        else:
+            percent = 100
+        if percent != self.budget_percent:
+            self.budget_percent = percent
+            self._apply_budget()
+            if LOG_ENABLE[TAG_MIDI]:
+                log(TAG_MIDI, f"MPE budget {percent}% (loop latency {self.loop_latency_ms}ms)")
             
     def can_process_message(self, msg_type, channel):
-        """Check if a message can be processed based on ratios"""
+        """Check if a message fits its channel's budget for that dimension"""
         # Note messages are always processed
         if msg_type in ['note_on', 'note_off']:
             return True
-            
-        # Map message type to ratio config and counter key
-        ratio_map = {
-            'pitch_bend': ('pitch_bend_ratio', 'pitch_bend'),
-            'channel_pressure': ('pressure_ratio', 'pressure'),
-            'cc': ('timbre_ratio', 'timbre')
-        }
+        return self.can_process_dimension(MPE_DIMENSION_INDEX[msg_type], channel)
         
-        ratio_key, count_key = ratio_map[msg_type]
-        ratio = MPE_FILTER_CONFIG[ratio_key]
+    def can_process_dimension(self, dim, channel):
+        """Token bucket check by dimension index (see MPE_DIMENSIONS)"""
+        bucket = channel * len(MPE_DIMENSIONS) + dim
+        rate = self.configured[dim]
         
-        if ratio == 0:  # Filter all if ratio is 0
-            self.channel_messages[channel]['filtered'][count_key] += 1
+        if rate < 0:  # Unlimited
+            self.allowed[bucket] += 1
+            return True
+            
+        if rate == 0:  # Filter all
+            self.filtered[bucket] += 1
             return False
             
-        if ratio == 1:  # Allow all if ratio is 1
-            self.channel_messages[channel]['allowed'][count_key] += 1
-            return True
+        # Lazy refill from the last time this bucket was touched
+        elapsed = ticks_diff(self.now, self.last_refill[bucket])
+        tokens = self.tokens[bucket]
+        if elapsed < 0 or elapsed >= self.refill_ms[dim]:
+            # Idle long enough to fill, or so long the tick difference wrapped
+            tokens = self.capacities[dim]
+            self.last_refill[bucket] = self.now
+        elif elapsed > 0:
+            tokens = min(self.capacities[dim], tokens + elapsed * self.rates[dim])
+            self.last_refill[bucket] = self.now
             
-        # Increment position and wrap around to 1 when we hit ratio
-        self.positions[count_key] = (self.positions[count_key] % ratio) + 1
-        
-        # Allow through when we hit ratio
-        should_process = self.positions[count_key] == ratio
-        
-        if should_process:
-            self.channel_messages[channel]['allowed'][count_key] += 1
-        else:
-            self.channel_messages[channel]['filtered'][count_key] += 1
+        if tokens >= 1000:
+            self.tokens[bucket] = tokens - 1000
+            self.allowed[bucket] += 1
+            return True
             
-        return should_process
+        self.tokens[bucket] = tokens
+        self.filtered[bucket] += 1
+        return False
             
     def get_channel_stats(self, channel):
         """Get message statistics for a channel"""
-        stats = self.channel_messages[channel]
+        base = channel * len(MPE_DIMENSIONS)
         return {
-            'pitch_bend': stats['allowed']['pitch_bend'],
-            'pressure': stats['allowed']['pressure'],
-            'timbre': stats['allowed']['timbre'],
-            'filtered': stats['filtered']
+            'pitch_bend': self.allowed[base],
+            'pressure': self.allowed[base + 1],
+            'timbre': self.allowed[base + 2],
+            'filtered': {
+                'pitch_bend': self.filtered[base],
+                'pressure': self.filtered[base + 1],
+                'timbre': self.filtered[base + 2]
+            }
         }
+        
+    def get_totals(self):
+        """Get allowed and filtered totals across all channels"""
+        return sum(self.allowed), sum(self.filtered)
 
 class MidiSubscription:
     """Filtered MIDI message subscription"""
@@ -112,6 +234,14 @@ class MidiSubscription:
             
         return True
 
+    def covers_type(self, msg_type):
+        """Check if this subscription accepts a message type"""
+        return not self.message_types or msg_type in self.message_types
+
+    def covers_channel(self, channel):
+        """Check if this subscription accepts a channel"""
+        return self.channels is None or channel in self.channels
+
 class MPEZone:
     """Manages an MPE zone (lower or upper)"""
     def __init__(self, is_lower_zone=True):
@@ -119,16 +249,16 @@ class MPEZone:
         self.master_channel = MPE_LOWER_ZONE_MASTER if is_lower_zone else MPE_UPPER_ZONE_MASTER
         
         self.member_channels = list(range(1, 15))  # Channels 2-15
-        
-        # Initialize per-channel state
-        self.channel_states = {}
+        self.member_mask = 0
         for channel in self.member_channels:
-            self.channel_states[channel] = {
-                'active_notes': {},  # note_num: velocity
-                'pressure': 0,
-                'timbre': 64,  # CC 74
-                'bend': 8192  # 14-bit centered
-            }
+            self.member_mask |= 1 << channel
+        
+        # Per-channel state in fixed arrays indexed by channel
+        self.pressure = bytearray(16)
+        self.timbre = bytearray([64] * 16)  # CC 74
+        self.bend = array.array('H', [8192] * 16)  # 14-bit centered
+        self.note_velocities = bytearray(16 * 128)  # channel * 128 + note, 0 = not active
+        self.note_counts = bytearray(16)  # Active notes per channel
             
     def get_physical_channel(self, member_channel):
         """Convert logical member channel to physical MIDI channel"""
@@ -148,70 +278,128 @@ class MPEZone:
         else:
             return (channel - (MPE_UPPER_ZONE_MASTER - 14)) in self.member_channels
 
+    def get_active_note_count(self, channel):
+        """Get number of active notes on a channel"""
+        return self.note_counts[channel]
+        
+    def clear_notes(self, channel):
+        """Forget all active notes on a channel"""
+        if self.note_counts[channel]:
+            start = channel * 128
+            self.note_velocities[start:start + 128] = bytes(128)
+            self.note_counts[channel] = 0
+            
+    def reset_controllers(self, channel):
+        """Return a channel's expression state to defaults"""
+        self.pressure[channel] = 0
+        self.timbre[channel] = 64
+        self.bend[channel] = 8192
+
     def update_state(self, msg, message_counter):
         """Update zone state based on MIDI message"""
         channel = msg.channel
+        if not self.member_mask & (1 << channel):
+            return
         zone_name = 'lower' if self.is_lower_zone else 'upper'
         
         if msg.type == 'note_on':
-            log(TAG_MIDI, f"MPE Note On: zone={zone_name} ch={channel} note={msg.note} vel={msg.velocity}")
-            if channel in self.channel_states:
-                self.channel_states[channel]['active_notes'][msg.note] = msg.velocity
+            if LOG_ENABLE[TAG_MIDI]:
+                log(TAG_MIDI, f"MPE Note On: zone={zone_name} ch={channel} note={msg.note} vel={msg.velocity}")
+            index = channel * 128 + msg.note
+            if not self.note_velocities[index]:
+                self.note_counts[channel] += 1
+            self.note_velocities[index] = msg.velocity
                 
         elif msg.type == 'note_off':
-            log(TAG_MIDI, f"MPE Note Off: zone={zone_name} ch={channel} note={msg.note} release_vel={msg.release_velocity}")
-            if channel in self.channel_states:
-                if msg.note in self.channel_states[channel]['active_notes']:
-                    del self.channel_states[channel]['active_notes'][msg.note]
-                    # Log detailed MPE statistics for this channel
-                    stats = message_counter.get_channel_stats(channel)
-                    filtered = stats['filtered']
-                    log(TAG_MIDI, f"Channel {channel} MPE message statistics:")
-                    log(TAG_MIDI, f"    Pitch Bend:")
-                    log(TAG_MIDI, f"        Allowed: {stats['pitch_bend']}")
-                    log(TAG_MIDI, f"        Filtered: {filtered['pitch_bend']}")
-                    log(TAG_MIDI, f"        Total: {stats['pitch_bend'] + filtered['pitch_bend']}")
-                    log(TAG_MIDI, f"    Pressure:")
-                    log(TAG_MIDI, f"        Allowed: {stats['pressure']}")
-                    log(TAG_MIDI, f"        Filtered: {filtered['pressure']}")
-                    log(TAG_MIDI, f"        Total: {stats['pressure'] + filtered['pressure']}")
-                    log(TAG_MIDI, f"    Timbre:")
-                    log(TAG_MIDI, f"        Allowed: {stats['timbre']}")
-                    log(TAG_MIDI, f"        Filtered: {filtered['timbre']}")
-                    log(TAG_MIDI, f"        Total: {stats['timbre'] + filtered['timbre']}")
+            if LOG_ENABLE[TAG_MIDI]:
+                log(TAG_MIDI, f"MPE Note Off: zone={zone_name} ch={channel} note={msg.note} release_vel={msg.release_velocity}")
+            index = channel * 128 + msg.note
+            if self.note_velocities[index]:
+                self.note_velocities[index] = 0
+                self.note_counts[channel] -= 1
+                if not LOG_ENABLE[TAG_MIDI]:
+                    return
+                # Log detailed MPE statistics for this channel
+                stats = message_counter.get_channel_stats(channel)
+                filtered = stats['filtered']
+                log(TAG_MIDI, f"Channel {channel} MPE message statistics:")
+                log(TAG_MIDI, f"    Pitch Bend:")
+                log(TAG_MIDI, f"        Allowed: {stats['pitch_bend']}")
+                log(TAG_MIDI, f"        Filtered: {filtered['pitch_bend']}")
+                log(TAG_MIDI, f"        Total: {stats['pitch_bend'] + filtered['pitch_bend']}")
+                log(TAG_MIDI, f"    Pressure:")
+                log(TAG_MIDI, f"        Allowed: {stats['pressure']}")
+                log(TAG_MIDI, f"        Filtered: {filtered['pressure']}")
+                log(TAG_MIDI, f"        Total: {stats['pressure'] + filtered['pressure']}")
+                log(TAG_MIDI, f"    Timbre:")
+                log(TAG_MIDI, f"        Allowed: {stats['timbre']}")
+                log(TAG_MIDI, f"        Filtered: {filtered['timbre']}")
+                log(TAG_MIDI, f"        Total: {stats['timbre'] + filtered['timbre']}")
                     
         elif msg.type == 'channel_pressure':
-            if channel in self.channel_states:
+            if LOG_ENABLE[TAG_MIDI]:
                 log(TAG_MIDI, f"MPE Pressure: zone={zone_name} ch={channel} pressure={msg.pressure}")
-                self.channel_states[channel]['pressure'] = msg.pressure
+            self.pressure[channel] = msg.pressure
                 
         elif msg.type == 'pitch_bend':
-            if channel in self.channel_states:
+            if LOG_ENABLE[TAG_MIDI]:
                 log(TAG_MIDI, f"MPE Pitch Bend: zone={zone_name} ch={channel} value={msg.bend}")
-                self.channel_states[channel]['bend'] = msg.bend
+            self.bend[channel] = msg.bend
                 
         elif msg.type == 'cc':
-            if msg.control == MPE_TIMBRE_CC and channel in self.channel_states:
-                log(TAG_MIDI, f"MPE CC: zone={zone_name} ch={channel} cc={msg.control} value={msg.value}")
-                self.channel_states[channel]['timbre'] = msg.value
+            if msg.control == MPE_TIMBRE_CC:
+                if LOG_ENABLE[TAG_MIDI]:
+                    log(TAG_MIDI, f"MPE CC: zone={zone_name} ch={channel} cc={msg.control} value={msg.value}")
+                self.timbre[channel] = msg.value
 
 class MidiMessage:
-    """MIDI message with MPE awareness"""
-    def __init__(self, status_byte, data=None):
+    """MIDI message with MPE awareness.
+    
+    Messages are recycled by MidiMessagePool, so a subscriber that needs a
+    value after its callback returns must copy it out.
+    """
+    def __init__(self, status_byte=0, data=None):
+        self.status_byte = 0
+        self.data = bytearray(2)  # Preallocated data bytes, reused on reload
+        self.channel = 0
+        self.message_type = 0
+        
+        # Initialize with defaults
+        self.type = 'unknown'
+        self.note = 0
+        self.velocity = 0
+        self.release_velocity = 0  # Added release_velocity attribute
+        self.control = 0
+        self.value = 0
+        self.pressure = 0
+        self.bend = 8192
+        self.program = 0
+        
+        if status_byte:
+            d0 = data[0] if data else 0
+            d1 = data[1] if data and len(data) > 1 else 0
+            self.load(status_byte, d0, d1)
+
+    def load(self, status_byte, data0=0, data1=0):
+        """Reinitialize this message in place from raw bytes"""
         self.status_byte = status_byte
-        self.data = data if data else []
+        self.data[0] = data0
+        self.data[1] = data1
         self.channel = status_byte & 0x0F
         self.message_type = status_byte & 0xF0
         
-        # Initialize with defaults
         self.type = 'unknown'
         self.note = 0
         self.velocity = 0
-        self.release_velocity = 0  # Added release_velocity attribute
+        self.release_velocity = 0
         self.control = 0
         self.value = 0
         self.pressure = 0
         self.bend = 8192
+        self.program = 0
+        
+        self._parse_message()
+        return self
 
     def _parse_message(self):
         """Parse MIDI message and set appropriate properties"""
@@ -222,29 +410,45 @@ class MidiMessage:
                 self.type = 'note_on' if self.velocity > 0 else 'note_off'
                 if self.velocity == 0:  # Note off via note-on with zero velocity
                     self.release_velocity = 0
-                log(TAG_MIDI, f"Created Note {self.type}: ch={self.channel} note={self.note} vel={self.velocity}")
+                if LOG_ENABLE[TAG_MIDI]:
+                    log(TAG_MIDI, f"Created Note {self.type}: ch={self.channel} note={self.note} vel={self.velocity}")
                 
             elif self.message_type == MIDI_NOTE_OFF:
                 self.type = 'note_off'
                 self.note = self.data[0]
                 self.release_velocity = self.data[1]  # Use release_velocity instead of velocity for note-off
-                log(TAG_MIDI, f"Created Note Off: ch={self.channel} note={self.note} release_vel={self.release_velocity}")
+                if LOG_ENABLE[TAG_MIDI]:
+                    log(TAG_MIDI, f"Created Note Off: ch={self.channel} note={self.note} release_vel={self.release_velocity}")
                 
             elif self.message_type == MIDI_CONTROL_CHANGE:
-                self.type = 'cc'
                 self.control = self.data[0]
                 self.value = self.data[1]
-                log(TAG_MIDI, f"Created CC: ch={self.channel} cc={self.control} val={self.value}")
+                if self.control in MIDI_CHANNEL_MODE_CCS:
+                    self.type = 'channel_mode'
+                    if LOG_ENABLE[TAG_MIDI]:
+                        log(TAG_MIDI, f"Created Channel Mode: ch={self.channel} cc={self.control} val={self.value}")
+                else:
+                    self.type = 'cc'
+                    if LOG_ENABLE[TAG_MIDI]:
+                        log(TAG_MIDI, f"Created CC: ch={self.channel} cc={self.control} val={self.value}")
+                
+            elif self.message_type == MIDI_PROGRAM_CHANGE:
+                self.type = 'program_change'
+                self.program = self.data[0]
+                if LOG_ENABLE[TAG_MIDI]:
+                    log(TAG_MIDI, f"Created Program Change: ch={self.channel} program={self.program}")
                 
             elif self.message_type == MIDI_CHANNEL_PRESSURE:
                 self.type = 'channel_pressure'
                 self.pressure = self.data[0]
-                log(TAG_MIDI, f"Created Channel Pressure: ch={self.channel} pressure={self.pressure}")
+                if LOG_ENABLE[TAG_MIDI]:
+                    log(TAG_MIDI, f"Created Channel Pressure: ch={self.channel} pressure={self.pressure}")
                 
             elif self.message_type == MIDI_PITCH_BEND:
                 self.type = 'pitch_bend'
                 self.bend = (self.data[1] << 7) | self.data[0]
-                log(TAG_MIDI, f"Created Pitch Bend: ch={self.channel} value={self.bend}")
+                if LOG_ENABLE[TAG_MIDI]:
+                    log(TAG_MIDI, f"Created Pitch Bend: ch={self.channel} value={self.bend}")
                 
         except Exception as e:
             log(TAG_MIDI, f"Error parsing MIDI message: {str(e)}", is_error=True)
@@ -253,10 +457,8 @@ class MidiMessage:
     @property
     def length(self):
         """Expected message length based on status byte"""
-        if self.message_type == MIDI_CHANNEL_PRESSURE:
-            return 2
-        elif self.message_type < MIDI_SYSTEM_MESSAGE:
-            return 3
+        if self.message_type < MIDI_SYSTEM_MESSAGE:
+            return MIDI_DATA_LENGTHS[(self.message_type >> 4) - 8] + 1
         return 1
 
     def is_complete(self):
@@ -269,107 +471,734 @@ class MidiMessage:
             return self.type == other
         return NotImplemented
 
+class MidiMessagePool:
+    """Fixed ring of reusable MidiMessage objects"""
+    def __init__(self, size=MIDI_MESSAGE_POOL_SIZE):
+        self.messages = [MidiMessage() for _ in range(size)]
+        self.size = size
+        self.index = 0
+        
+    def acquire(self, status_byte, data0=0, data1=0):
+        """Load the next pooled message from raw bytes"""
+        msg = self.messages[self.index]
+        self.index = (self.index + 1) % self.size
+        return msg.load(status_byte, data0, data1)
+
+class MidiCoalescer:
+    """Last-value-wins holding area for continuous controller messages.
+    
+    One slot per (channel, dimension): dimensions 0-127 are CC numbers,
+    then pitch bend and channel pressure. Only MIDI_CONTINUOUS_CCS are
+    held, other CCs dispatch in order like notes.
+    """
+    DIM_BEND = 128
+    DIM_PRESSURE = 129
+    SLOTS_PER_CHANNEL = 130
+    
+    def __init__(self):
+        size = 16 * self.SLOTS_PER_CHANNEL
+        self.values = array.array('h', [-1] * size)  # -1 = slot empty
+        self.pending = array.array('H', [0] * size)  # Slot keys in arrival order
+        self.pending_count = 0
+        self.coalesced = 0  # Messages replaced by a newer value
+        self._message = MidiMessage()  # Reused for emitted messages
+        self.continuous = bytearray(128)  # 1 for CCs that may be held
+        for cc in MIDI_CONTINUOUS_CCS:
+            self.continuous[cc] = 1
+        
+    def hold(self, msg):
+        """Take a continuous message, returns False if it must dispatch now"""
+        message_type = msg.message_type
+        if message_type == MIDI_CONTROL_CHANGE:
+            if not self.continuous[msg.control]:
+                return False
+            dim = msg.control
+            value = msg.value
+        elif message_type == MIDI_PITCH_BEND:
+            dim = self.DIM_BEND
+            value = msg.bend
+        elif message_type == MIDI_CHANNEL_PRESSURE:
+            dim = self.DIM_PRESSURE
+            value = msg.pressure
+        else:
+            return False
+            
+        key = msg.channel * self.SLOTS_PER_CHANNEL + dim
+        if self.values[key] < 0:
+            self.pending[self.pending_count] = key
+            self.pending_count += 1
+        else:
+            self.coalesced += 1
+        self.values[key] = value
+        return True
+        
+    def _emit(self, key, handler):
+        """Dispatch one held slot and clear it, a slot the handler refuses stays held"""
+        value = self.values[key]
+        channel = key // self.SLOTS_PER_CHANNEL
+        dim = key % self.SLOTS_PER_CHANNEL
+        if dim == self.DIM_BEND:
+            msg = self._message.load(MIDI_PITCH_BEND | channel, value & 0x7F, value >> 7)
+        elif dim == self.DIM_PRESSURE:
+            msg = self._message.load(MIDI_CHANNEL_PRESSURE | channel, value)
+        else:
+            msg = self._message.load(MIDI_CONTROL_CHANGE | channel, dim, value)
+        if not handler(msg):
+            return False
+        self.values[key] = -1
+        return True
+        
+    def flush_channel(self, channel, handler):
+        """Dispatch held values for one channel and for channel 0, which
+        covers every channel (channel 0 itself dispatches everything)"""
+        if not self.pending_count:
+            return
+        first = channel * self.SLOTS_PER_CHANNEL
+        last = first + self.SLOTS_PER_CHANNEL
+        kept = 0
+        refused = False  # Once the handler refuses, the rest wait in order
+        for i in range(self.pending_count):
+            key = self.pending[i]
+            if not refused and (not channel or key < self.SLOTS_PER_CHANNEL or first <= key < last):
+                if self._emit(key, handler):
+                    continue
+                refused = True
+            self.pending[kept] = key
+            kept += 1
+        self.pending_count = kept
+        
+    def discard_channel(self, channel):
+        """Drop held values for one channel, or all channels for channel 0"""
+        first = channel * self.SLOTS_PER_CHANNEL
+        last = first + self.SLOTS_PER_CHANNEL
+        kept = 0
+        for i in range(self.pending_count):
+            key = self.pending[i]
+            if not channel or first <= key < last:
+                self.values[key] = -1
+            else:
+                self.pending[kept] = key
+                kept += 1
+        self.pending_count = kept
+        
+    def flush(self, handler):
+        """Dispatch all held values in arrival order.
+        
+        Values the handler refuses (a full queue) stay held, newer values
+        still replace them, and go out on a later flush.
+        """
+        count = self.pending_count
+        for i in range(count):
+            if not self._emit(self.pending[i], handler):
+                pending = self.pending
+                for j in range(i, count):
+                    pending[j - i] = pending[j]
+                self.pending_count = count - i
+                return
+        self.pending_count = 0
+
+class MidiEventQueue:
+    """Bounded rings of raw channel events waiting for dispatch.
+    
+    Note on/off, Program Change and channel mode messages go to the high
+    priority ring and are served before the normal ring, so a flood of
+    expression data can delay but never starve them. Order within a channel
+    is kept: before a high priority event is served, normal events queued
+    ahead of it on its channel (or on channel 0, which covers every channel)
+    are served first. Each event is stored as 3 raw bytes and a sequence
+    number.
+    """
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+    
+    def __init__(self, size=MIDI_EVENT_QUEUE_SIZE):
+        self.size = size
+        self.rings = (bytearray(size * 3), bytearray(size * 3))
+        self.sequences = (array.array('H', [0] * size), array.array('H', [0] * size))
+        self.heads = array.array('H', [0, 0])
+        self.counts = array.array('H', [0, 0])
+        self.sequence = 0  # Stamped on each event, wraps at 16 bits
+        self._deferred_mark = 0  # First sequence not yet counted as deferred
+        
+        # Counters
+        self.max_depth = 0
+        self.deferred = 0  # Events carried over to a later update, each counted once
+        self.dropped = 0  # Events lost to a full ring
+        self.rx_paused = 0  # Source reads skipped for lack of queue room
+        
+    @property
+    def depth(self):
+        return self.counts[0] + self.counts[1]
+        
+    @property
+    def free(self):
+        """Events either ring is sure to take"""
+        return self.size - max(self.counts[0], self.counts[1])
+        
+    def push(self, status_byte, data0, data1):
+        """Queue one event, returns False if its ring is full"""
+        message_type = status_byte & 0xF0
+        if (message_type == MIDI_NOTE_ON or message_type == MIDI_NOTE_OFF or
+                message_type == MIDI_PROGRAM_CHANGE or
+                (message_type == MIDI_CONTROL_CHANGE and data0 >= 120)):
+            level = self.PRIORITY_HIGH
+        else:
+            level = self.PRIORITY_NORMAL
+            
+        count = self.counts[level]
+        if count >= self.size:
+            self.dropped += 1
+            return False
+            
+        ring = self.rings[level]
+        slot = (self.heads[level] + count) % self.size
+        i = slot * 3
+        ring[i] = status_byte
+        ring[i + 1] = data0
+        ring[i + 2] = data1
+        self.sequences[level][slot] = self.sequence
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        self.counts[level] = count + 1
+        
+        depth = self.counts[0] + self.counts[1]
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+        
+    def pop(self, pool):
+        """Load the next event into a pooled message, high priority first"""
+        if self.counts[0]:
+            high = self.heads[0]
+            channel = self.rings[0][high * 3] & 0x0F
+            sequence = self.sequences[0][high]
+            
+            # The first normal event sharing the channel is the oldest, serve
+            # it first if it was queued before the high priority one
+            ring = self.rings[1]
+            size = self.size
+            head = self.heads[1]
+            for k in range(self.counts[1]):
+                slot = (head + k) % size
+                normal_channel = ring[slot * 3] & 0x0F
+                if normal_channel == channel or normal_channel == 0 or channel == 0:
+                    if 0 < ((sequence - self.sequences[1][slot]) & 0xFFFF) < 0x8000:
+                        return self._take_normal(pool, k)
+                    break
+            return self._take(pool, self.PRIORITY_HIGH)
+            
+        if self.counts[1]:
+            return self._take(pool, self.PRIORITY_NORMAL)
+        return None
+        
+    def _take(self, pool, level):
+        """Pop the head of a ring"""
+        ring = self.rings[level]
+        head = self.heads[level]
+        i = head * 3
+        self.heads[level] = (head + 1) % self.size
+        self.counts[level] -= 1
+        return pool.acquire(ring[i], ring[i + 1], ring[i + 2])
+        
+    def _take_normal(self, pool, offset):
+        """Remove the normal event offset places from the head, keeping the rest in order"""
+        ring = self.rings[1]
+        sequences = self.sequences[1]
+        size = self.size
+        head = self.heads[1]
+        slot = (head + offset) % size
+        i = slot * 3
+        msg = pool.acquire(ring[i], ring[i + 1], ring[i + 2])
+        
+        # Shift the events ahead of it up one slot to close the gap
+        while slot != head:
+            previous = (slot - 1) % size
+            i = slot * 3
+            j = previous * 3
+            ring[i] = ring[j]
+            ring[i + 1] = ring[j + 1]
+            ring[i + 2] = ring[j + 2]
+            sequences[slot] = sequences[previous]
+            slot = previous
+        self.heads[1] = (head + 1) % size
+        self.counts[1] -= 1
+        return msg
+        
+    def count_deferred(self):
+        """Add events queued since the last call and still waiting to deferred.
+        
+        Sequences rise from head to tail in each ring, so the new events
+        are a run at the tail.
+        
+        Returns:
+            Number of events newly deferred
+        """
+        mark = self._deferred_mark
+        size = self.size
+        deferred = 0
+        for level in (self.PRIORITY_HIGH, self.PRIORITY_NORMAL):
+            sequences = self.sequences[level]
+            head = self.heads[level]
+            k = self.counts[level]
+            while k and ((sequences[(head + k - 1) % size] - mark) & 0xFFFF) < 0x8000:
+                k -= 1
+                deferred += 1
+        self._deferred_mark = self.sequence
+        self.deferred += deferred
+        return deferred
+        
+    def clear(self):
+        """Discard everything queued"""
+        self.heads[0] = self.heads[1] = 0
+        self.counts[0] = self.counts[1] = 0
+
 class MidiParser:
     """MIDI byte stream parser"""
     def __init__(self, message_counter):
         self.message_counter = message_counter
+        self.message_pool = MidiMessagePool()
         self.bytes_processed = 0
         self.collecting_data = False
         self.current_status = None
-        self.current_data = []
-        self.channel_states = {}  # Store last values using raw bytes
+        self.current_data = bytearray(2)  # Preallocated data bytes
+        self.data_count = 0
+        self.expected_data = 0  # Data bytes needed for current status
+        self.system_data = 0  # System common data bytes still to skip
+        self.resyncs = 0  # Truncated messages and stray data bytes
+        self.active_sensing = 0  # Active Sensing bytes since the sender went quiet
+        
+        # Last accepted raw values per channel for threshold filtering
+        self.last_pressure = bytearray(16)
+        self.last_bend = array.array('H', [8192] * 16)  # Center
+        self.last_timbre = bytearray([64] * 16)
+        
+        # Accept mask derived from subscriptions: 16-bit channel masks per
+        # status nibble (0x80-0xE0) and per CC number
+        self.accept_types = array.array('H', [0xFFFF] * 7)
+        self.accept_ccs = array.array('H', [0xFFFF] * 128)
+        self.messages_rejected = 0
+        self.messages_parsed = 0  # Complete channel messages
+        self.messages_thresholded = 0  # Dropped as too small a change
+        
+        # SysEx frames stream into a fixed buffer, complete payloads go to
+        # the callback as a memoryview that is only valid during the call
+        self.sysex_buffer = bytearray(MIDI_SYSEX_BUFFER_SIZE)
+        self.sysex_view = memoryview(self.sysex_buffer)
+        self.sysex_callback = None
+        self.in_sysex = False
+        self.sysex_length = 0
+        self.sysex_overflow = False
+        self.sysex_received = 0
+        self.sysex_dropped = 0  # Oversized or interrupted frames
+        
+    def reset_channel(self, channel):
+        """Return a channel's threshold state to controller defaults"""
+        self.last_pressure[channel] = 0
+        self.last_bend[channel] = 8192
+        self.last_timbre[channel] = 64
+        
+    def set_accept_masks(self, type_masks, cc_masks):
+        """Replace the accept mask (7 status nibble masks, 128 CC masks)"""
+        for i in range(7):
+            self.accept_types[i] = type_masks[i]
+        for i in range(128):
+            self.accept_ccs[i] = cc_masks[i]
+            
+    def accepts(self, status_byte, data0):
+        """Check raw status/data against the accept mask"""
+        index = (status_byte >> 4) - 8
+        if index == 3:  # Control change, masked per controller
+            mask = self.accept_ccs[data0]
+        else:
+            mask = self.accept_types[index]
+        return mask & (1 << (status_byte & 0x0F))
         
-    def get_message_type(self, status_byte):
-        """Get message type from status byte for early filtering"""
-        message_type = status_byte & 0xF0
-        if message_type == MIDI_CHANNEL_PRESSURE:
-            return 'channel_pressure'
-        elif message_type == MIDI_PITCH_BEND:
-            return 'pitch_bend'
-        elif message_type == MIDI_CONTROL_CHANGE:
-            return 'cc'
-        return None
-
     def check_threshold(self, status_byte, data):
         """Check value thresholds using raw bytes before message creation"""
-        msg_type = self.get_message_type(status_byte)
-        if not msg_type:
-            return True  # Non-continuous messages pass through
-            
+        message_type = status_byte & 0xF0
         channel = status_byte & 0x0F
-        if channel not in self.channel_states:
-            self.channel_states[channel] = {
-                'pressure': 0,
-                'pitch_bend_lsb': 0,
-                'pitch_bend_msb': 0x40,  # Center = 8192
-                'timbre': 64
-            }
             
-        if msg_type == 'channel_pressure':
-            delta = abs(data[0] - self.channel_states[channel]['pressure'])
-            if delta < MPE_FILTER_CONFIG['pressure_threshold']:
+        if message_type == MIDI_CHANNEL_PRESSURE:
+            if abs(data[0] - self.last_pressure[channel]) < MPE_FILTER_CONFIG['pressure_threshold']:
                 return False
-            self.channel_states[channel]['pressure'] = data[0]
+            self.last_pressure[channel] = data[0]
             
-        elif msg_type == 'pitch_bend':
+        elif message_type == MIDI_PITCH_BEND:
             # Compare 14-bit values without creating objects
-            current = (self.channel_states[channel]['pitch_bend_msb'] << 7) | self.channel_states[channel]['pitch_bend_lsb']
             new = (data[1] << 7) | data[0]
-            delta = abs(new - current)
-            if delta < MPE_FILTER_CONFIG['pitch_bend_threshold']:
+            if abs(new - self.last_bend[channel]) < MPE_FILTER_CONFIG['pitch_bend_threshold']:
                 return False
-            self.channel_states[channel]['pitch_bend_lsb'] = data[0]
-            self.channel_states[channel]['pitch_bend_msb'] = data[1]
+            self.last_bend[channel] = new
             
-        elif msg_type == 'cc' and data[0] == MPE_TIMBRE_CC:
-            delta = abs(data[1] - self.channel_states[channel]['timbre'])
-            if delta < MPE_FILTER_CONFIG['timbre_threshold']:
+        elif message_type == MIDI_CONTROL_CHANGE and data[0] == MPE_TIMBRE_CC:
+            if abs(data[1] - self.last_timbre[channel]) < MPE_FILTER_CONFIG['timbre_threshold']:
                 return False
-            self.channel_states[channel]['timbre'] = data[1]
+            self.last_timbre[channel] = data[1]
             
         return True
 
+    def _end_sysex(self, complete):
+        """Close the current SysEx frame, delivering it if whole and in bounds"""
+        self.in_sysex = False
+        if not complete or self.sysex_overflow:
+            self.sysex_dropped += 1
+            if LOG_ENABLE[TAG_MIDI]:
+                log(TAG_MIDI, f"Dropped SysEx frame ({self.sysex_length} bytes, complete={complete})")
+            return
+            
+        self.sysex_received += 1
+        if self.sysex_callback:
+            try:
+                self.sysex_callback(self.sysex_view[:self.sysex_length])
+            except Exception as e:
+                log(TAG_MIDI, f"SysEx callback error: {str(e)}", is_error=True)
+            
     def process_byte(self, byte):
-        """Process a single MIDI byte with early filtering"""
+        """Process a single MIDI byte with early filtering.
+        
+        Returns a pooled MidiMessage that is only valid until the pool wraps.
+        """
         self.bytes_processed += 1
         
         if byte & 0x80:  # Status byte
-            if byte < 0xF8:  # Not realtime
+            if byte >= 0xF8:
+                # Realtime bytes may be interleaved anywhere, even inside
+                # SysEx, and leave state untouched
+                if byte == MIDI_ACTIVE_SENSING:
+                    self.active_sensing += 1
+                return None
+            if self.in_sysex:
+                self._end_sysex(byte == MIDI_SYSEX_END)
+                if byte == MIDI_SYSEX_END:
+                    return None
+                    
+            if self.data_count:
+                # A message was cut short, bytes were lost or corrupted
+                self.resyncs += 1
+            self.system_data = 0
+                
+            if byte < MIDI_SYSTEM_MESSAGE:
+                # Channel status, also becomes the running status
                 self.current_status = byte
-                self.current_data = []
+                self.data_count = 0
+                self.expected_data = MIDI_DATA_LENGTHS[(byte >> 4) - 8]
                 self.collecting_data = True
+            else:
+                # System common messages cancel running status, their data
+                # bytes are skipped as there is no status to collect for
+                self.current_status = None
+                self.data_count = 0
+                self.collecting_data = False
+                self.system_data = MIDI_SYSTEM_DATA_LENGTHS[byte - MIDI_SYSTEM_MESSAGE]
+                if byte == MIDI_SYSEX_START:
+                    self.in_sysex = True
+                    self.sysex_length = 0
+                    self.sysex_overflow = False
+            return None
+            
+        if self.in_sysex:
+            if self.sysex_length < MIDI_SYSEX_BUFFER_SIZE:
+                self.sysex_buffer[self.sysex_length] = byte
+                self.sysex_length += 1
+            else:
+                self.sysex_overflow = True
             return None
             
         if self.collecting_data:
-            self.current_data.append(byte)
-            expected_length = 2 if (self.current_status & 0xF0) == MIDI_CHANNEL_PRESSURE else 3
+            data = self.current_data
+            data[self.data_count] = byte
+            self.data_count += 1
             
-            if len(self.current_data) >= expected_length - 1:
-                self.collecting_data = False
+            if self.data_count >= self.expected_data:
+                # Keep collecting under running status, the next data byte
+                # starts a new message with the same status
+                self.data_count = 0
+                self.messages_parsed += 1
                 channel = self.current_status & 0x0F
+                if self.expected_data == 1:
+                    data[1] = 0
+                
+                # Reject messages no subscriber wants before any other work,
+                # keeping threshold state in step with the controller
+                if not self.accepts(self.current_status, data[0]):
+                    if channel != 0:
+                        self.check_threshold(self.current_status, data)
+                    self.messages_rejected += 1
+                    return None
                 
                 # Channel 0 bypasses all filtering
                 if channel == 0:
-                    msg = MidiMessage(self.current_status, self.current_data[:])
-                    msg._parse_message()
-                    return msg
+                    return self.message_pool.acquire(self.current_status, data[0], data[1])
                 
                 # Early threshold check on raw bytes
-                if not self.check_threshold(self.current_status, self.current_data):
+                if not self.check_threshold(self.current_status, data):
+                    self.messages_thresholded += 1
                     return None
                     
-                # Check rate limit before creating message
-                msg_type = self.get_message_type(self.current_status)
-                if msg_type and not self.message_counter.can_process_message(msg_type, channel):
+                # Check rate limit before creating message (CCs only for timbre)
+                message_type = self.current_status & 0xF0
+                if message_type == MIDI_PITCH_BEND:
+                    dim = 0
+                elif message_type == MIDI_CHANNEL_PRESSURE:
+                    dim = 1
+                elif message_type == MIDI_CONTROL_CHANGE and data[0] == MPE_TIMBRE_CC:
+                    dim = 2
+                else:
+                    dim = -1
+                if dim >= 0 and not self.message_counter.can_process_dimension(dim, channel):
                     return None
                     
-                # Only create and parse message if it passes all filters
-                msg = MidiMessage(self.current_status, self.current_data[:])
-                msg._parse_message()
-                return msg
+                # Only load a pooled message if it passes all filters
+                return self.message_pool.acquire(self.current_status, data[0], data[1])
                 
+        elif self.system_data:
+            self.system_data -= 1
+        else:
+            # Data byte with no status to belong to
+            self.resyncs += 1
         return None
 
+class MidiCapture:
+    """Ring buffer of raw received bytes with receive ticks.
+    
+    Each read is recorded as one chunk (tick, source index, bytes). Dumps
+    are text lines of the form "cap <tick> <source> <hex>" which
+    replay_capture() feeds back through MidiParser.
+    """
+    def __init__(self, size=MIDI_CAPTURE_SIZE, chunks=MIDI_CAPTURE_CHUNKS):
+        self.size = size
+        self.data = bytearray(size)
+        self.written = 0  # Total bytes recorded
+        
+        self.chunks = chunks
+        self.chunk_ticks = array.array('L', [0] * chunks)
+        self.chunk_starts = array.array('L', [0] * chunks)  # Offsets into the byte stream
+        self.chunk_lengths = array.array('H', [0] * chunks)
+        self.chunk_sources = bytearray(chunks)
+        self.chunks_written = 0
+        
+    def record(self, tick, source, buf, count):
+        """Copy count bytes from buf into the ring"""
+        size = self.size
+        if count > size:
+            return
+        pos = self.written % size
+        first = min(count, size - pos)
+        self.data[pos:pos + first] = buf[:first]
+        if first < count:
+            self.data[:count - first] = buf[first:count]
+            
+        slot = self.chunks_written % self.chunks
+        self.chunk_ticks[slot] = tick
+        self.chunk_starts[slot] = self.written
+        self.chunk_lengths[slot] = count
+        self.chunk_sources[slot] = source
+        self.chunks_written += 1
+        self.written += count
+        
+    def clear(self):
+        self.written = 0
+        self.chunks_written = 0
+        
+    def lines(self):
+        """Yield captured chunks oldest first as text lines"""
+        size = self.size
+        oldest_byte = self.written - size
+        first_chunk = max(0, self.chunks_written - self.chunks)
+        for n in range(first_chunk, self.chunks_written):
+            slot = n % self.chunks
+            start = self.chunk_starts[slot]
+            if start < oldest_byte:
+                continue  # Bytes already overwritten
+            length = self.chunk_lengths[slot]
+            hex_data = ''.join(f'{self.data[(start + i) % size]:02x}' for i in range(length))
+            yield f"cap {self.chunk_ticks[slot]} {self.chunk_sources[slot]} {hex_data}"
+            
+    def dump(self, writer):
+        """Send each captured line to writer, e.g. TextProtocol.write"""
+        count = 0
+        for line in self.lines():
+            writer(line)
+            count += 1
+        return count
+        
+    def dump_to_file(self, path):
+        """Write the capture to a file (filesystem must be writable)"""
+        try:
+            with open(path, 'w') as f:
+                return self.dump(lambda line: f.write(line + '\n'))
+        except OSError as e:
+            log(TAG_MIDI, f"Capture dump to {path} failed: {str(e)}", is_error=True)
+            return 0
+
+def replay_capture(lines, callback=None):
+    """Feed captured lines back through MidiParser.
+    
+    Each source gets its own parser, the rate limiter runs on the captured
+    ticks. Lines without a capture record (e.g. text framing) are skipped.
+    
+    Args:
+        lines: Iterable of lines from MidiCapture.dump
+        callback: Optional callback(tick, msg) for each parsed message
+        
+    Returns:
+        Number of messages parsed
+    """
+    counter = None  # Started from the first captured tick, not the replaying clock
+    parsers = {}
+    messages = 0
+    for line in lines:
+        start = line.find('cap ')
+        if start < 0:
+            continue
+        fields = line[start:].split()
+        if len(fields) < 4:
+            continue
+        tick = int(fields[1])
+        if counter is None:
+            counter = MPEMessageCounter(tick)
+        parser = parsers.get(fields[2])
+        if parser is None:
+            parser = parsers[fields[2]] = MidiParser(counter)
+        counter.update(tick)
+        hex_data = fields[3].split(']')[0]  # Drop text protocol framing
+        for i in range(0, len(hex_data) - 1, 2):
+            msg = parser.process_byte(int(hex_data[i:i + 2], 16))
+            if msg and msg.type != 'unknown':
+                messages += 1
+                if callback:
+                    callback(tick, msg)
+    return messages
+
+class MidiThru:
+    """Forwards received bytes to an output transport, filtered by channel and type.
+    
+    Runs of complete accepted messages go out as one low priority write
+    straight from the RX buffer, so forwarding never blocks and local
+    output can only land between whole messages. Nothing is forwarded
+    while the output's text is unframed (text_framed), since the receiver
+    would parse the text as MIDI data. A message that can't be
+    sent from the buffer (it relies on running status, spans two reads or
+    had a filtered realtime byte inside it) is rebuilt with its status
+    byte in a three byte buffer. SysEx and system common messages are not
+    forwarded.
+    """
+    def __init__(self, output, channel_mask=0xFFFF, type_mask=0xFF):
+        self.output = output
+        self.channel_mask = channel_mask  # Bit per channel 0-15
+        self.type_mask = type_mask  # MIDI_THRU_TYPE_BITS
+        
+        self._message = bytearray(3)  # Status and data of the current message
+        self._message_views = tuple(memoryview(self._message)[:n] for n in range(4))
+        self._status = 0  # Running status, 0 outside channel messages
+        self._accept = False
+        self._expected = 0
+        self._count = 0  # Data bytes received for the current message
+        self._start = -1  # Offset of the current message in this read, -1 to rebuild
+        
+        # Pending run of complete accepted messages in the current read
+        self._span_start = -1
+        self._span_end = 0
+        self._span_status = False  # Run holds a status byte running status can follow
+        
+        self.forwarded = 0
+        self.filtered = 0
+        self.dropped = 0  # Writes lost to a full TX ring
+        self.held = 0  # Writes withheld while the output's text is unframed
+        
+    def set_filter(self, channels=None, message_types=None):
+        """Limit forwarding to channels (0-15) and message types, None passes all"""
+        self.channel_mask = 0xFFFF
+        if channels is not None:
+            self.channel_mask = 0
+            for channel in channels:
+                self.channel_mask |= 1 << channel
+        self.type_mask = 0xFF
+        if message_types is not None:
+            self.type_mask = 0
+            for message_type in message_types:
+                self.type_mask |= MIDI_THRU_TYPE_BITS[message_type]
+        self._status = 0  # Pick up the new filter from the next status byte
+        
+    def forward(self, buf, count):
+        """Forward the first count bytes of a read"""
+        for i in range(count):
+            byte = buf[i]
+            if byte >= 0xF8:
+                if self.type_mask & MIDI_THRU_REALTIME:
+                    if self._start < 0:
+                        self._extend(buf, i, i + 1)
+                    # Inside a message it goes out with the message
+                elif self._start >= 0:
+                    # Can't skip a byte in the middle of a run
+                    self._start = -1
+            elif byte & 0x80:
+                self._count = 0
+                self._start = -1
+                if byte >= MIDI_SYSTEM_MESSAGE:
+                    self._status = 0  # Cancels running status
+                    continue
+                self._status = byte
+                self._expected = MIDI_DATA_LENGTHS[(byte >> 4) - 8]
+                self._accept = bool((self.channel_mask >> (byte & 0x0F)) & 1 and
+                                    self.type_mask & (1 << ((byte >> 4) - 8)))
+                self._message[0] = byte
+                if self._accept:
+                    self._start = i
+            elif self._status:
+                if self._count == 0 and self._start < 0 and self._accept:
+                    # Running status may continue a run that started with a status byte
+                    if self._span_status and self._span_start >= 0 and self._span_end == i:
+                        self._start = i
+                self._count += 1
+                self._message[self._count] = byte
+                if self._count == self._expected:
+                    if not self._accept:
+                        self.filtered += 1
+                    elif self._start >= 0:
+                        self._extend(buf, self._start, i + 1)
+                        self._span_status = True
+                        self.forwarded += 1
+                    else:
+                        self._flush(buf)
+                        self._write(self._message_views[self._expected + 1])
+                        self.forwarded += 1
+                    self._count = 0
+                    self._start = -1
+        self._flush(buf)
+        self._start = -1  # A message still open continues from _message
+        
+    def _extend(self, buf, start, end):
+        """Add a complete message to the pending run"""
+        if self._span_start >= 0 and self._span_end == start:
+            self._span_end = end
+            return
+        self._flush(buf)
+        self._span_start = start
+        self._span_end = end
+        
+    def _flush(self, buf):
+        """Queue the pending run"""
+        if self._span_start >= 0:
+            self._write(buf[self._span_start:self._span_end])
+            self._span_start = -1
+            self._span_status = False
+            
+    def _write(self, data):
+        if not self.output.text_framed:
+            self.held += 1
+        elif not self.output.write(data, True):
+            self.dropped += 1
+
+class MidiSource:
+    """An input transport with its own parser state"""
+    def __init__(self, name, transport, parser, max_chunks=0):
+        self.name = name
+        self.transport = transport
+        self.parser = parser
+        self.max_chunks = max_chunks  # RX chunks per update, 0 drains fully
+        self.bytes_total = 0
+        self.thru = None  # Optional MidiThru fed with this source's raw bytes
+
 class MidiInterface:
     """MIDI interface with MPE support"""
     def __init__(self, transport):
@@ -378,6 +1207,54 @@ class MidiInterface:
         self.parser = MidiParser(self.message_counter)
         self.subscribers = []
         
+        # Input sources merged into one event stream, the UART comes first
+        self.sources = (MidiSource('uart', transport, self.parser),)
+        
+        # Dispatch index compiled from subscribers, also drives the parser's accept mask
+        self._type_index = {}  # type -> per-channel tuple of callbacks (non-CC)
+        self._cc_index = [{} for _ in range(16)]  # channel -> {cc: callbacks}
+        self._cc_any = [()] * 16  # channel -> callbacks taking any CC
+        
+        # Optional coalescing of continuous messages within one update pass
+        self.coalescer = MidiCoalescer() if MIDI_COALESCE else None
+        
+        # Prioritized events between the RX pump and dispatch, served within
+        # a per-update budget
+        self.event_queue = MidiEventQueue()
+        self.event_budget = MIDI_EVENT_BUDGET
+        self.time_budget_ms = MIDI_TIME_BUDGET_MS
+        
+        # RX health: updates spaced further apart than the UART buffer can
+        # cover, reads that found the buffer full, and the worst gap seen
+        self.rx_stalls = 0
+        self.rx_overflows = 0
+        self.max_update_gap_ms = 0
+        self._last_update = None  # No gap to measure before the first update
+        
+        # Active Sensing on the UART: once the sender has used it, input
+        # silent for MIDI_SENSING_TIMEOUT_MS means the link is gone
+        self._sensing_bytes = 0  # UART byte count at the last check
+        self._last_sensed = None  # Tick of the last input while sensing
+        self.sensing_timeouts = 0
+        
+        # Optional raw RX capture for diagnosing field problems
+        self.capture = MidiCapture() if MIDI_CAPTURE else None
+        
+        # Optional MIDI thru, raw input forwarded to the UART TX
+        if MIDI_THRU:
+            self.sources[0].thru = MidiThru(transport)
+        
+        # Preallocated RX buffer for bulk reads
+        self.bulk_rx = MIDI_BULK_RX
+        self._rx_buffer = bytearray(MIDI_RX_BUFFER_SIZE)
+        self._rx_view = memoryview(self._rx_buffer)
+        
+        # Throughput tracking (bytes parsed per second)
+        self.rx_bytes_total = 0
+        self.rx_bytes_per_sec = 0
+        self._rx_window_bytes = 0
+        self._rx_window_start = ticks_ms()
+        
         # Initialize MPE zones
         self.lower_zone = MPEZone(is_lower_zone=True)
         self.upper_zone = None  # Initialize upper zone only if needed
@@ -386,18 +1263,290 @@ class MidiInterface:
         if LOG_ENABLE[TAG_MIDI]:
             self.active_notes = {}  # {channel: {note: velocity}}
         
+        # Nothing is accepted until something subscribes
+        self._rebuild_dispatch()
+        
         log(TAG_MIDI, "MIDI Interface initialized with MPE support")
         
     def process_midi_messages(self):
-        """Process incoming MIDI data"""
-        while self.transport.in_waiting:
-            byte = self.transport.read(1)
-            if not byte:
+        """Process incoming MIDI data within this update's budget"""
+        start = ticks_ms()
+        self.message_counter.update(start)
+        
+        if self._last_update is not None:
+            gap = ticks_diff(start, self._last_update)
+            if gap > self.max_update_gap_ms:
+                self.max_update_gap_ms = gap
+            capacity = self.transport.rx_capacity_ms
+            if capacity and gap > capacity:
+                self.rx_stalls += 1
+                log(TAG_MIDI, f"Loop stalled {gap}ms, RX buffer covers {capacity}ms", is_error=True)
+        self._last_update = start
+        
+        if self.bulk_rx:
+            self._process_bulk(start)
+        else:
+            self._process_bytewise(start)
+            
+        if self.parser.active_sensing:
+            self._check_sensing(start)
+            
+        if self.coalescer:
+            self.coalescer.flush(self._enqueue_message)
+            
+        self._dispatch_events(start)
+        
+    def _check_sensing(self, now):
+        """Release every note if an Active Sensing sender goes quiet"""
+        uart = self.sources[0]
+        if uart.bytes_total != self._sensing_bytes or self._last_sensed is None:
+            self._sensing_bytes = uart.bytes_total
+            self._last_sensed = now
+        elif ticks_diff(now, self._last_sensed) > MIDI_SENSING_TIMEOUT_MS:
+            log(TAG_MIDI, f"Active Sensing lost for {MIDI_SENSING_TIMEOUT_MS}ms, releasing notes", is_error=True)
+            self.sensing_timeouts += 1
+            self.parser.active_sensing = 0  # Disarmed until the sender resumes
+            self._last_sensed = None
+            self._accept_message(self.parser.message_pool.acquire(
+                MIDI_CONTROL_CHANGE, MIDI_ALL_NOTES_OFF, 0))
+        
+    def _process_bulk(self, now):
+        """Bulk read path"""
+        view = self._rx_view
+        capture = self.capture
+        queue = self.event_queue
+        for index, source in enumerate(self.sources):
+            transport = source.transport
+            parser = source.parser
+            chunks = source.max_chunks  # Counts down past zero when unlimited
+            
+            # Drain what is waiting into the preallocated buffer
+            waiting = transport.in_waiting
+            if transport.rx_buffer_size and waiting >= transport.rx_buffer_size:
+                self.rx_overflows += 1
+            while waiting:
+                # Each byte completes at most one event, never read more than
+                # the queue can take along with values the coalescer holds
+                size = min(waiting, MIDI_RX_BUFFER_SIZE, self._rx_room())
+                if not size:
+                    queue.rx_paused += 1
+                    break
+                count = transport.readinto(view[:size])
+                if not count:
+                    break
+                if capture:
+                    capture.record(now, index, view, count)
+                    
+                for i in range(count):
+                    msg = parser.process_byte(view[i])
+                    if msg and msg.type != 'unknown':
+                        self._accept_message(msg)
+                        
+                if source.thru:
+                    source.thru.forward(view, count)
+                    
+                source.bytes_total += count
+                self._update_throughput(count, now)
+                chunks -= 1
+                if chunks == 0:
+                    break
+                waiting = transport.in_waiting
+            
+    def _process_bytewise(self, now):
+        """Legacy single-byte read path"""
+        capture = self.capture
+        queue = self.event_queue
+        for index, source in enumerate(self.sources):
+            transport = source.transport
+            while transport.in_waiting:
+                if not self._rx_room():
+                    queue.rx_paused += 1
+                    break
+                byte = transport.read(1)
+                if not byte:
+                    break
+                if capture:
+                    capture.record(now, index, byte, 1)
+                    
+                msg = source.parser.process_byte(byte[0])
+                if msg and msg.type != 'unknown':
+                    self._accept_message(msg)
+                if source.thru:
+                    source.thru.forward(byte, 1)
+                source.bytes_total += 1
+                self._update_throughput(1, now)
+                
+    def _rx_room(self):
+        """Bytes that can be read without an event finding its ring full"""
+        room = self.event_queue.free
+        if self.coalescer:
+            room -= self.coalescer.pending_count
+        return room if room > 0 else 0
+        
+    def add_transport(self, name, transport, max_chunks=0):
+        """Merge another input transport into the event stream.
+        
+        The source gets its own parser so running status and SysEx state
+        never mix between inputs. Rate limiting is shared across sources.
+        """
+        parser = MidiParser(self.message_counter)
+        parser.set_accept_masks(self.parser.accept_types, self.parser.accept_ccs)
+        parser.sysex_callback = self.parser.sysex_callback
+        source = MidiSource(name, transport, parser, max_chunks)
+        thru = self.sources[0].thru
+        if thru:
+            source.thru = MidiThru(self.transport, thru.channel_mask, thru.type_mask)
+        self.sources = self.sources + (source,)
+        log(TAG_MIDI, f"Added MIDI input: {name}")
+        return source
+            
+    def _accept_message(self, msg):
+        """Hold continuous messages for coalescing, queue everything else.
+        
+        Held values for the message's channel are queued first so they are
+        not left behind by the notes that follow them.
+        """
+        coalescer = self.coalescer
+        if coalescer:
+            if coalescer.hold(msg):
+                return
+            if msg.type == 'channel_mode' and msg.control == MIDI_RESET_ALL_CONTROLLERS:
+                # Held values predate the reset and would undo it
+                coalescer.discard_channel(msg.channel)
+            else:
+                coalescer.flush_channel(msg.channel, self._enqueue_message)
+        self._enqueue_message(msg)
+        
+    def _enqueue_message(self, msg):
+        """Copy a message's raw bytes into the event queue"""
+        data = msg.data
+        return self.event_queue.push(msg.status_byte, data[0], data[1])
+        
+    def _dispatch_events(self, start):
+        """Dispatch queued events until the queue or the budget runs out"""
+        queue = self.event_queue
+        pool = self.parser.message_pool
+        dispatched = 0
+        while queue.depth:
+            if dispatched >= self.event_budget:
                 break
+            # Clock reads are cheap but not free, check every 8 events
+            if (dispatched & 7) == 7 and ticks_diff(ticks_ms(), start) >= self.time_budget_ms:
+                break
+            self._handle_message(queue.pop(pool))
+            dispatched += 1
+            
+        deferred = queue.count_deferred()
+        if deferred and LOG_ENABLE[TAG_MIDI]:
+            log(TAG_MIDI, f"Deferred {deferred} new events to next update, {queue.depth} waiting")
                 
-            msg = self.parser.process_byte(byte[0])
-            if msg and msg.type != 'unknown':
-                self._handle_message(msg)
+    def enable_capture(self, enabled=True):
+        """Start or stop raw RX capture, starting discards the old capture"""
+        if enabled:
+            if self.capture:
+                self.capture.clear()
+            else:
+                self.capture = MidiCapture()
+        else:
+            self.capture = None
+        log(TAG_MIDI, f"MIDI capture {'enabled' if enabled else 'disabled'}")
+        
+    def enable_thru(self, enabled=True, channels=None, message_types=None):
+        """Forward every input to the UART TX, optionally filtered.
+        
+        Args:
+            enabled: False stops forwarding
+            channels: Channels (0-15) to forward, None for all
+            message_types: Names from MIDI_THRU_TYPE_BITS, None for all
+        """
+        for source in self.sources:
+            if not enabled:
+                source.thru = None
+                continue
+            if not source.thru:
+                source.thru = MidiThru(self.transport)
+            source.thru.set_filter(channels, message_types)
+        log(TAG_MIDI, f"MIDI thru {'enabled' if enabled else 'disabled'}")
+        if enabled and not self.transport.text_framed:
+            log(TAG_MIDI, "MIDI thru held until the base station takes framed text")
+        
+    def get_thru_stats(self):
+        """Get per-source thru counters"""
+        return {source.name: {
+                    'forwarded': source.thru.forwarded,
+                    'filtered': source.thru.filtered,
+                    'dropped': source.thru.dropped,
+                    'held': source.thru.held
+                } for source in self.sources if source.thru}
+        
+    def set_sysex_callback(self, callback):
+        """Register a callback for complete SysEx payloads (None to clear).
+        
+        The callback gets a memoryview of the bytes between F0 and F7 and
+        must copy anything it needs to keep.
+        """
+        for source in self.sources:
+            source.parser.sysex_callback = callback
+        
+    def get_rx_health(self):
+        """Get RX loss indicators for sizing the UART buffer"""
+        return {
+            'stalls': self.rx_stalls,
+            'overflows': self.rx_overflows,
+            'max_gap_ms': self.max_update_gap_ms,
+            'capacity_ms': self.transport.rx_capacity_ms,
+            'resyncs': sum(source.parser.resyncs for source in self.sources),
+            'sensing_timeouts': self.sensing_timeouts
+        }
+        
+    def get_queue_stats(self):
+        """Get event queue counters"""
+        queue = self.event_queue
+        return {
+            'depth': queue.depth,
+            'max_depth': queue.max_depth,
+            'deferred': queue.deferred,
+            'dropped': queue.dropped,
+            'rx_paused': queue.rx_paused
+        }
+            
+    def _update_throughput(self, count, now):
+        """Accumulate parsed byte count and roll the bytes/sec window at tick now"""
+        self.rx_bytes_total += count
+        self._rx_window_bytes += count
+        elapsed = ticks_diff(now, self._rx_window_start)
+        if elapsed >= 1000 or elapsed < 0:
+            # A negative span means the window is too old to measure
+            self.rx_bytes_per_sec = self._rx_window_bytes * 1000 // elapsed if elapsed > 0 else 0
+            self._rx_window_bytes = 0
+            self._rx_window_start = now
+            if LOG_ENABLE[TAG_MIDI]:
+                log(TAG_MIDI, f"RX throughput: {self.rx_bytes_per_sec} bytes/sec")
+                
+    def get_parse_stats(self):
+        """Get parsed and filtered message counts across sources"""
+        parsed = rejected = thresholded = 0
+        for source in self.sources:
+            parser = source.parser
+            parsed += parser.messages_parsed
+            rejected += parser.messages_rejected
+            thresholded += parser.messages_thresholded
+        return {
+            'parsed': parsed,
+            'rejected': rejected,
+            'thresholded': thresholded,
+            'rate_limited': self.message_counter.get_totals()[1]
+        }
+        
+    def get_throughput(self):
+        """Get RX throughput counters"""
+        # Roll the window so a quiet input reads as quiet, not as the last busy second
+        self._update_throughput(0, ticks_ms())
+        return {
+            'bytes_total': self.rx_bytes_total,
+            'bytes_per_sec': self.rx_bytes_per_sec,
+            'sources': {source.name: source.bytes_total for source in self.sources}
+        }
 
     def _handle_message(self, msg):
         """Update MPE state based on message"""
@@ -421,6 +1570,9 @@ class MidiInterface:
                 total_notes = sum(len(notes) for notes in self.active_notes.values())
                 log(TAG_MIDI, f"{total_notes} active notes")
         
+        if msg.type == 'channel_mode':
+            self._reset_channel_state(msg)
+            
         # Determine which zone the message belongs to
         zone = self.lower_zone
         if self.upper_zone and msg.channel >= MPE_UPPER_ZONE_MASTER - 14:
@@ -430,28 +1582,135 @@ class MidiInterface:
             zone.update_state(msg, self.message_counter)
             self._distribute_message(msg)
 
+    def _reset_channel_state(self, msg):
+        """Apply a channel mode message to parser and zone state.
+        
+        Sent on channel 0 (the zone master) it applies to every channel.
+        """
+        channels = range(16) if msg.channel == 0 else (msg.channel,)
+        zone = self.lower_zone
+        for channel in channels:
+            if msg.control == MIDI_RESET_ALL_CONTROLLERS:
+                zone.reset_controllers(channel)
+                for source in self.sources:
+                    source.parser.reset_channel(channel)
+            else:
+                zone.clear_notes(channel)
+                if LOG_ENABLE[TAG_MIDI] and channel in self.active_notes:
+                    del self.active_notes[channel]
+        log(TAG_MIDI, f"Channel mode {msg.control} on channel {msg.channel}")
+        
     def _distribute_message(self, msg):
-        """Send message to matching subscribers"""
-        for subscription in self.subscribers:
-            if subscription.matches(msg):
-                try:
-                    subscription.callback(msg)
-                except Exception as e:
-                    log(TAG_MIDI, str(e), is_error=True)
+        """Send message to subscribers through the dispatch index"""
+        channel = msg.channel
+        if msg.type == 'cc':
+            callbacks = self._cc_index[channel].get(msg.control, self._cc_any[channel])
+        else:
+            by_channel = self._type_index.get(msg.type)
+            if by_channel is None:
+                return
+            callbacks = by_channel[channel]
+            
+        for callback in callbacks:
+            try:
+                callback(msg)
+            except Exception as e:
+                log(TAG_MIDI, str(e), is_error=True)
+
+    def _rebuild_dispatch(self):
+        """Compile subscriptions into per type/channel/CC callback tuples.
+        
+        New containers are built each time so a dispatch already in progress
+        keeps iterating the index it started with.
+        """
+        subscribers = self.subscribers
+        
+        type_index = {}
+        for msg_type in MIDI_MESSAGE_TYPES:
+            if msg_type == 'cc':
+                continue
+            subs = [s for s in subscribers if s.covers_type(msg_type)]
+            if subs:
+                type_index[msg_type] = [
+                    tuple(s.callback for s in subs if s.covers_channel(ch))
+                    for ch in range(16)
+                ]
+                
+        cc_subs = [s for s in subscribers if s.covers_type('cc')]
+        specific_ccs = set()
+        for s in cc_subs:
+            if s.cc_numbers is not None:
+                specific_ccs.update(s.cc_numbers)
+                
+        cc_index = []
+        cc_any = []
+        for ch in range(16):
+            channel_subs = [s for s in cc_subs if s.covers_channel(ch)]
+            cc_any.append(tuple(s.callback for s in channel_subs if s.cc_numbers is None))
+            by_cc = {}
+            for cc in specific_ccs:
+                callbacks = tuple(s.callback for s in channel_subs
+                                  if s.cc_numbers is None or cc in s.cc_numbers)
+                if callbacks:
+                    by_cc[cc] = callbacks
+            cc_index.append(by_cc)
+            
+        self._type_index = type_index
+        self._cc_index = cc_index
+        self._cc_any = cc_any
+        self._update_accept_masks()
+        
+    def _update_accept_masks(self):
+        """Derive the parser's raw-byte accept mask from the dispatch index"""
+        type_masks = [0] * 7
+        type_nibbles = (
+            ('note_off', (0, 1)),  # Note off may arrive as note on with zero velocity
+            ('note_on', (1,)),
+            ('program_change', (4,)),
+            ('channel_pressure', (5,)),
+            ('pitch_bend', (6,))
+        )
+        for msg_type, nibbles in type_nibbles:
+            by_channel = self._type_index.get(msg_type)
+            if by_channel is None:
+                continue
+            for ch in range(16):
+                if by_channel[ch]:
+                    for nibble in nibbles:
+                        type_masks[nibble] |= 1 << ch
+                        
+        cc_masks = [0] * 128
+        mode_channels = self._type_index.get('channel_mode')
+        for ch in range(16):
+            bit = 1 << ch
+            any_cc = self._cc_any[ch]
+            by_cc = self._cc_index[ch]
+            for cc in range(128):
+                if cc in MIDI_CHANNEL_MODE_CCS:
+                    if mode_channels is not None and mode_channels[ch]:
+                        cc_masks[cc] |= bit
+                elif by_cc.get(cc, any_cc):
+                    cc_masks[cc] |= bit
+                    
+        for source in self.sources:
+            source.parser.set_accept_masks(type_masks, cc_masks)
 
     def subscribe(self, callback, message_types=None, channels=None, cc_numbers=None):
         """Add a filtered subscription"""
         log(TAG_MIDI, f"Creating subscription with types={message_types}")
         subscription = MidiSubscription(callback, message_types, channels, cc_numbers)
         log(TAG_MIDI, f"Created subscription with types={subscription.message_types}")
-        self.subscribers.append(subscription)
+        # Replace rather than mutate so a callback can (un)subscribe mid-dispatch
+        self.subscribers = self.subscribers + [subscription]
+        self._rebuild_dispatch()
         log(TAG_MIDI, f"Added subscription for types={message_types} channels={channels} cc={cc_numbers}")
         return subscription
 
     def unsubscribe(self, subscription):
         """Remove a subscription"""
         if subscription in self.subscribers:
-            self.subscribers.remove(subscription)
+            self.subscribers = [s for s in self.subscribers if s is not subscription]
+            self._rebuild_dispatch()
             log(TAG_MIDI, "Removed subscription")
 
 def initialize_midi():
@@ -459,6 +1718,12 @@ def initialize_midi():
     from uart import UartManager
     transport, _ = UartManager.get_interfaces()
     midi_interface = MidiInterface(transport)
+    if MIDI_USB_INPUT:
+        try:
+            from uart import UsbMidiTransport
+            midi_interface.add_transport('usb', UsbMidiTransport(MIDI_RX_BUFFER_SIZE), MIDI_USB_MAX_CHUNKS)
+        except Exception as e:
+            log(TAG_MIDI, f"USB MIDI input unavailable: {str(e)}")
     UartManager.set_midi_interface(midi_interface)
     log(TAG_MIDI, "MIDI system initialized")
     return midi_interface
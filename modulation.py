@@ -329,6 +329,11 @@ class ModulationManager:
         """Clean up per-note blocks when note is released."""
         note_key = (note_num, channel)
         if note_key in self.note_blocks:
+            # Stop running the note's blocks along with forgetting them
+            synth_blocks = self.synth.synth.blocks
+            for block in self.note_blocks[note_key].values():
+                if block in synth_blocks:
+                    synth_blocks.remove(block)
             del self.note_blocks[note_key]
             
     def cleanup(self):
@@ -2,7 +2,11 @@
 
 import sys
 import array
-from logging import log, TAG_PATCH, format_value
+from logging import log, TAG_PATCH, LOG_ENABLE, format_value
+from midi import MIDI_ALL_SOUND_OFF, MIDI_RESET_ALL_CONTROLLERS
+
+# Channel scope used for all values routed from incoming messages
+CHANNEL_ACTION = {'use_channel': True}
 
 class MidiHandler:
     """Handles MIDI message processing, routing, and setup."""
@@ -12,6 +16,7 @@ class MidiHandler:
         self.router = get_router()
         self.midi_interface = None
         self.subscription = None
+        self.mode_subscription = None
         self.ready_callback = None
 
     def on_instrument_change(self, instrument_name, config_name, paths):
@@ -93,8 +98,43 @@ class MidiHandler:
             except Exception as e:
                 log(TAG_PATCH, f"Failed to send startup value: {str(e)}", is_error=True)
 
+    def replay_startup_values(self, channel):
+        """Restore non-LFO startup values after a controller reset.
+        
+        Args:
+            channel: Channel that was reset, 0 for all channels
+        """
+        startup_values, _ = self.router.get_startup_values()
+        if not startup_values:
+            return
+            
+        for handler, config in startup_values.items():
+            # Block setup and routing live in modulation, not the store
+            if handler.startswith('lfo_') or handler.startswith('route_') or handler.startswith('block_'):
+                continue
+            try:
+                target = channel if channel else (1 if config['use_channel'] else 0)
+                self.synthesizer.handle_value(handler, config['value'], target)
+            except Exception as e:
+                log(TAG_PATCH, f"Failed to replay startup value: {str(e)}", is_error=True)
+
+    def handle_channel_mode(self, msg):
+        """Handle All Sound Off, Reset All Controllers and All Notes Off."""
+        channel = msg.channel
+        if msg.control == MIDI_RESET_ALL_CONTROLLERS:
+            log(TAG_PATCH, f"Reset all controllers: ch={channel}")
+            self.synthesizer.reset_channel(channel)
+            self.replay_startup_values(channel)
+        else:
+            # synthio has no hard stop, both release in one batch
+            released = self.synthesizer.release_channel(channel)
+            log(TAG_PATCH, f"{'All sound off' if msg.control == MIDI_ALL_SOUND_OFF else 'All notes off'}: ch={channel} released={released}")
+
     def cleanup(self):
         """Clean up MIDI subscription."""
+        if self.mode_subscription:
+            self.midi_interface.unsubscribe(self.mode_subscription)
+            self.mode_subscription = None
         if self.subscription:
             self.midi_interface.unsubscribe(self.subscription)
             self.subscription = None
@@ -109,27 +149,33 @@ class MidiHandler:
         """Set the MIDI interface to use."""
         self.midi_interface = midi_interface
         log(TAG_PATCH, "MIDI interface set")
+        # Channel mode handling does not depend on the instrument's paths
+        self.mode_subscription = midi_interface.subscribe(
+            self.handle_channel_mode,
+            message_types=['channel_mode']
+        )
         # Set up initial handlers
         self.setup_handlers()
 
     def handle_message(self, msg):
         """Log and route incoming MIDI messages."""
         # Log received MIDI message
-        if msg.type == 'note_on':
-            log(TAG_PATCH, "Received MIDI note-on: ch={} note={} vel={}".format(
-                msg.channel, msg.note, msg.velocity))
-        elif msg.type == 'note_off':
-            log(TAG_PATCH, "Received MIDI note-off: ch={} note={}".format(
-                msg.channel, msg.note))
-        elif msg.type == 'cc':
-            log(TAG_PATCH, "Received MIDI CC: ch={} cc={} val={}".format(
-                msg.channel, msg.control, msg.value))
-        elif msg.type == 'pitch_bend':
-            log(TAG_PATCH, "Received MIDI pitch bend: ch={} val={}".format(
-                msg.channel, msg.bend))
-        elif msg.type == 'channel_pressure':
-            log(TAG_PATCH, "Received MIDI pressure: ch={} pressure={}".format(
-                msg.channel, msg.pressure))
+        if LOG_ENABLE[TAG_PATCH]:
+            if msg.type == 'note_on':
+                log(TAG_PATCH, "Received MIDI note-on: ch={} note={} vel={}".format(
+                    msg.channel, msg.note, msg.velocity))
+            elif msg.type == 'note_off':
+                log(TAG_PATCH, "Received MIDI note-off: ch={} note={}".format(
+                    msg.channel, msg.note))
+            elif msg.type == 'cc':
+                log(TAG_PATCH, "Received MIDI CC: ch={} cc={} val={}".format(
+                    msg.channel, msg.control, msg.value))
+            elif msg.type == 'pitch_bend':
+                log(TAG_PATCH, "Received MIDI pitch bend: ch={} val={}".format(
+                    msg.channel, msg.bend))
+            elif msg.type == 'channel_pressure':
+                log(TAG_PATCH, "Received MIDI pressure: ch={} pressure={}".format(
+                    msg.channel, msg.pressure))
 
         # Get message type and values from router
         msg_type = self.router.get_message_type(msg)
@@ -147,12 +193,13 @@ class MidiHandler:
             return
             
         # Send all values
+        channel = self.router.get_channel_scope(msg, CHANNEL_ACTION)
         for handler, value in values.items():
-            channel = self.router.get_channel_scope(msg, {'use_channel': True})
-            log(TAG_PATCH, f"Setting {handler} = {format_value(value)} on channel {channel}")
-            # Log envelope parameter routing
-            if handler.startswith('attack_') or handler.startswith('decay_') or handler.startswith('release_') or handler.startswith('sustain_'):
-                log(TAG_PATCH, f"Routing envelope param {handler} from {msg.type} value {msg.value if hasattr(msg, 'value') else msg.velocity}")
+            if LOG_ENABLE[TAG_PATCH]:
+                log(TAG_PATCH, f"Setting {handler} = {format_value(value)} on channel {channel}")
+                # Log envelope parameter routing
+                if handler.startswith('attack_') or handler.startswith('decay_') or handler.startswith('release_') or handler.startswith('sustain_'):
+                    log(TAG_PATCH, f"Routing envelope param {handler} from {msg.type} value {msg.value if hasattr(msg, 'value') else msg.velocity}")
             self.synthesizer.handle_value(handler, value, channel)
                 
         # Press note after setting values
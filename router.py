@@ -6,7 +6,7 @@ import synthio
 from logging import log, TAG_ROUTE, format_value
 import synthio
 from synth_wave import WaveManager
-from constants import STATIC_WAVEFORM_SAMPLES
+from constants import STATIC_WAVEFORM_SAMPLES, INSTRUMENT_CACHE_SIZE
 from path_parser import PathParser
 
 # Order of operations for startup values
@@ -100,6 +100,15 @@ MESSAGE_TYPES = {
     }
 }
 
+# Prebuilt trigger tuples so message dispatch doesn't build strings or lists
+CC_TRIGGERS = tuple(("cc{}".format(cc_num),) for cc_num in range(128))
+MESSAGE_TRIGGERS = {
+    'note_on': ('note_on', 'velocity'),
+    'note_off': ('note_off',),
+    'pitch_bend': ('pitch_bend',),
+    'channel_pressure': ('channel_pressure',)
+}
+
 def format_instrument_name(name):
     """Format instrument name by converting underscores to spaces and capitalizing words.
     CircuitPython compatible version."""
@@ -130,6 +139,10 @@ config_format = {
     }
 }
 
+# Binary config frame: SysEx, non-commercial ID 0x7D, 'C' for config
+CONFIG_SYSEX_HEADER = b'\xf0\x7d\x43'
+CONFIG_SYSEX_VERSION = 1
+
 # Map internal handler names to human-readable control labels
 control_label_map = {
     # Envelope Controls
@@ -352,6 +365,29 @@ class Route:
             
         return self.lookup_table[value]
 
+class CompiledInstrument:
+    """Snapshot of router state for one parsed instrument, reused on recall."""
+    def __init__(self, router):
+        self.midi_mappings = router.midi_mappings
+        self.startup_values = router.startup_values
+        self.enabled_messages = router.enabled_messages
+        self.enabled_ccs = router.enabled_ccs
+        self.current_instrument_name = router.current_instrument_name
+        self.lfo_config = router.lfo_config
+        self.note_on_routes = router.note_on_routes
+        self.cc_config = router.cc_config
+
+    def apply(self, router):
+        """Make this instrument the router's current state."""
+        router.midi_mappings = self.midi_mappings
+        router.startup_values = self.startup_values
+        router.enabled_messages = self.enabled_messages
+        router.enabled_ccs = self.enabled_ccs
+        router.current_instrument_name = self.current_instrument_name
+        router.lfo_config = self.lfo_config
+        router.note_on_routes = self.note_on_routes
+        router.cc_config = self.cc_config
+
 class Router:
     """Route management service that creates and manages routes based on parsed path data."""
     def __init__(self):
@@ -364,19 +400,31 @@ class Router:
         self.on_paths_parsed = None
         self.path_parser = PathParser()
         self.lfo_config = {}  # Store LFO configuration from path parser
+        self._message_values = {}  # Reused by get_message_values
+        self.note_on_routes = {}
+        self.cc_config = None  # Cached config data/text/hash, built on first use
+        self._compiled = {}  # config_name -> CompiledInstrument
+        self._compiled_order = []  # Least recently used first
         
     def parse_paths(self, paths, config_name=None):
-        """Parse paths and create routes."""
+        """Parse paths and create routes, reusing a compiled instrument if cached."""
+        if config_name and self._recall_compiled(config_name):
+            # Notify listeners that paths have been parsed
+            if self.on_paths_parsed:
+                self.on_paths_parsed()
+            return
+            
         log(TAG_ROUTE, "Parsing instrument paths...")
         log(TAG_ROUTE, "----------------------------------------")
         
         try:
-            # Reset state
-            self.midi_mappings.clear()
-            self.startup_values.clear()
-            self.enabled_messages.clear()
+            # Reset state (fresh containers, cached instruments keep theirs)
+            self.midi_mappings = {}
+            self.startup_values = {}
+            self.enabled_messages = set()
             self.enabled_ccs = []
-            self.lfo_config.clear()  # Reset LFO config
+            self.lfo_config = {}  # Reset LFO config
+            self.cc_config = None
             
             # Parse paths
             parse_result = self.path_parser.parse_paths(paths, config_name)
@@ -397,6 +445,11 @@ class Router:
             self.current_instrument_name = parse_result.current_instrument_name
             self.lfo_config = parse_result.lfo_config  # Store LFO config from parser
             
+            if config_name:
+                # Build the config now so the compiled instrument keeps it
+                self.get_cc_config()
+                self._store_compiled(config_name)
+            
             # Notify listeners that paths have been parsed
             if self.on_paths_parsed:
                 self.on_paths_parsed()
@@ -405,6 +458,39 @@ class Router:
             log(TAG_ROUTE, f"Failed to parse paths: {str(e)}", is_error=True)
             raise
             
+    def _recall_compiled(self, config_name):
+        """Restore a previously compiled instrument. Returns True on cache hit."""
+        compiled = self._compiled.get(config_name)
+        if compiled is None:
+            return False
+        compiled.apply(self)
+        # Move to most recently used
+        self._compiled_order.remove(config_name)
+        self._compiled_order.append(config_name)
+        log(TAG_ROUTE, f"Recalled compiled instrument: {config_name}")
+        return True
+        
+    def _store_compiled(self, config_name):
+        """Cache current state as a compiled instrument, evicting the oldest."""
+        if config_name in self._compiled:
+            self._compiled_order.remove(config_name)
+        elif len(self._compiled_order) >= INSTRUMENT_CACHE_SIZE:
+            evicted = self._compiled_order.pop(0)
+            del self._compiled[evicted]
+            log(TAG_ROUTE, f"Evicted compiled instrument: {evicted}")
+        self._compiled[config_name] = CompiledInstrument(self)
+        self._compiled_order.append(config_name)
+        
+    def precompile(self, paths, config_name):
+        """Compile an instrument into the cache without making it current."""
+        if config_name in self._compiled:
+            return
+        current = CompiledInstrument(self)
+        try:
+            self.parse_paths(paths, config_name)
+        finally:
+            current.apply(self)
+            
     def _create_routes(self, parse_result):
         """Create routes from parsed path data."""
         # Create routes first
@@ -643,18 +729,17 @@ class Router:
             msg_type: Message type definition from MESSAGE_TYPES
             
         Returns:
-            Dict of collected values
+            Dict of collected values. The dict is reused between calls, so
+            callers must consume it before routing the next message.
         """
-        values = {}
+        values = self._message_values
+        values.clear()
         
         # Get triggers for this message type
-        triggers = []
         if msg.type == 'cc':
-            triggers.append(f"cc{msg.control}")
-        elif msg.type == 'note_on':
-            triggers.extend(['note_on', 'velocity'])
+            triggers = CC_TRIGGERS[msg.control]
         else:
-            triggers.append(msg.type)
+            triggers = MESSAGE_TRIGGERS.get(msg.type, ())
             
         # Process each trigger
         for trigger in triggers:
@@ -682,12 +767,41 @@ class Router:
         """
         return 0 if msg.channel == 0 or not action['use_channel'] else msg.channel
     
+    def get_cc_config(self):
+        """Get the current instrument's CC config, built once per instrument.
+        
+        Returns:
+            Dict with 'data' (see get_cc_config_data), 'text' (see
+            get_cc_configs) and 'hash' (FNV-1a of the text)
+        """
+        if self.cc_config is None:
+            data = self._build_cc_config_data()
+            text = self._format_cc_config(data)
+            self.cc_config = {
+                'data': data,
+                'text': text,
+                'hash': config_hash(text.encode('utf-8'))
+            }
+        return self.cc_config
+
+    def get_cc_config_data(self):
+        """Get CC configuration as structured data.
+        
+        Returns:
+            Dict with 'name' (display name or '') and 'pots', a list of
+            (pot_number, cc_number, control_label) tuples
+        """
+        return self.get_cc_config()['data']
+
     def get_cc_configs(self):
         """Generate CC configuration string."""
-        pot_mappings = []
+        return self.get_cc_config()['text']
+
+    def _build_cc_config_data(self):
+        """Collect pot mappings from the current routes"""
+        pots = []
         for pot_num, cc_num in enumerate(self.enabled_ccs):
-            midi_value = f"cc{cc_num}"
-            actions = self.midi_mappings.get(midi_value, [])
+            actions = self.midi_mappings.get(f"cc{cc_num}", [])
             
             if actions:
                 handler = actions[0]['handler']
@@ -695,15 +809,22 @@ class Router:
                     handler = handler[4:]
                 
                 # Get human-readable control label
-                control_label = control_label_map.get(handler, handler)
+                pots.append((pot_num, cc_num, control_label_map.get(handler, handler)))
                 
-                # Format pot mapping
-                pot_str = config_format['pot_mapping']['format'].format(
-                    pot_number=pot_num,
-                    cc_number=cc_num,
-                    controls=control_label
-                )
-                pot_mappings.append(pot_str)
+        name = format_instrument_name(self.current_instrument_name) if self.current_instrument_name else ''
+        return {'name': name, 'pots': pots}
+
+    def _format_cc_config(self, data):
+        """Render structured config data as the text config string"""
+        pot_mappings = []
+        for pot_num, cc_num, control_label in data['pots']:
+            # Format pot mapping
+            pot_str = config_format['pot_mapping']['format'].format(
+                pot_number=pot_num,
+                cc_number=cc_num,
+                controls=control_label
+            )
+            pot_mappings.append(pot_str)
         
         # Build final string
         parts = []
@@ -711,10 +832,7 @@ class Router:
             if element == 'cartridge_name':
                 parts.append('Candide')
             elif element == 'instrument_name':
-                if self.current_instrument_name:
-                    parts.append(format_instrument_name(self.current_instrument_name))
-                else:
-                    parts.append('')
+                parts.append(data['name'])
             elif element == 'type':
                 parts.append('cc')
             elif element == 'pot_mappings':
@@ -722,6 +840,71 @@ class Router:
         
         return config_format['structure']['separators']['main'].join(parts)
 
+def config_hash(data):
+    """32-bit FNV-1a hash of config bytes"""
+    value = 0x811C9DC5
+    for byte in data:
+        value = ((value ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return value
+
+def _encode_text7(text):
+    """Encode text as length-prefixed 7-bit ASCII, anything else becomes '?'"""
+    data = bytearray(min(len(text), 127) + 1)
+    data[0] = len(data) - 1
+    for i in range(data[0]):
+        code = ord(text[i])
+        data[i + 1] = code if code < 0x80 else 0x3F
+    return data
+
+def encode_cc_config(data):
+    """Encode structured CC config as a SysEx frame.
+    
+    F0 7D 43 <version> <name> <pot count> (<pot> <cc> <label>)* F7, where
+    text is a length byte followed by 7-bit ASCII.
+    """
+    frame = bytearray(CONFIG_SYSEX_HEADER)
+    frame.append(CONFIG_SYSEX_VERSION)
+    frame.extend(_encode_text7(data['name']))
+    frame.append(len(data['pots']))
+    for pot_num, cc_num, control_label in data['pots']:
+        frame.append(pot_num)
+        frame.append(cc_num)
+        frame.extend(_encode_text7(control_label))
+    frame.append(0xF7)
+    return frame
+
+def decode_cc_config(payload):
+    """Decode a config SysEx payload (bytes between F0 and F7).
+    
+    Returns:
+        Structured config dict, or None if the payload is not a config or
+        is cut short
+    """
+    header = len(CONFIG_SYSEX_HEADER) - 1  # Payload excludes F0
+    end = len(payload)
+    if (end <= header + 1 or bytes(payload[:header]) != CONFIG_SYSEX_HEADER[1:] or
+            payload[header] != CONFIG_SYSEX_VERSION):
+        return None
+    i = header + 1
+    length = payload[i]
+    if i + 1 + length >= end:  # Name and the pot count byte after it
+        return None
+    name = bytes(payload[i + 1:i + 1 + length]).decode('utf-8')
+    i += 1 + length
+    pots = []
+    for _ in range(payload[i]):
+        if i + 3 >= end:  # Pot, CC and label length
+            return None
+        pot_num = payload[i + 1]
+        cc_num = payload[i + 2]
+        length = payload[i + 3]
+        if i + 4 + length > end:
+            return None
+        label = bytes(payload[i + 4:i + 4 + length]).decode('utf-8')
+        pots.append((pot_num, cc_num, label))
+        i += 3 + length
+    return {'name': name, 'pots': pots}
+
 # Global router service
 _router = None
 
@@ -124,6 +124,18 @@ class Synthesizer:
             return False
         return self.note_manager.release_note(note_number, channel)
 
+    def release_channel(self, channel):
+        """Release every note on a channel (0 = all) in one batch."""
+        if not self._active:
+            return 0
+        return self.note_manager.release_channel(channel)
+        
+    def reset_channel(self, channel):
+        """Clear stored parameter values for a channel (0 = all)."""
+        if not self._active:
+            return
+        self.store.reset(channel)
+
     def create_math(self, name, operation, a, b=0.0, c=1.0):
         return self.modulation.create_math_block(name, operation, a, b, c)
 
@@ -196,11 +208,10 @@ class Synthesizer:
                 lfo_setup = value
                 lfo_name = lfo_setup['name']
                 
-                # Get steps list
-                steps = lfo_setup['steps']
-                
                 # Convert any string values to float in create params
-                for i, (step_type, params) in enumerate(steps):
+                # (into a local list - setups are cached and replayed on recall)
+                steps = []
+                for step_type, params in lfo_setup['steps']:
                     if step_type == 'create':
                         float_params = {}
                         for k, v in params.items():
@@ -208,7 +219,8 @@ class Synthesizer:
                                 float_params[k] = float(v)
                             except (ValueError, TypeError):
                                 float_params[k] = v
-                        steps[i] = (step_type, float_params)
+                        params = float_params
+                    steps.append((step_type, params))
                 
                 # Now process the parsed steps
                 for step, params in steps:
@@ -28,6 +28,7 @@ class NoteManager:
         self.modulation = modulation_manager
         self.notes = {}  # "note_number.channel" -> Note
         self.channel_map = {}  # channel -> note_number
+        self.stolen = 0  # Notes cut off by a new note on their channel
         
     def _build_note_params(self, note_number, frequency, channel, **params):
         """Build parameters for synthio.Note creation.
@@ -141,6 +142,8 @@ class NoteManager:
                 old_number = self.channel_map[channel]
                 old_address = f"{old_number}.{channel}"
                 old_note = self.notes.get(old_address)
+                if old_note:
+                    self.stolen += 1
                 log(TAG_NOTE, f"Channel {channel} has existing note {old_number}")
                 
             # Build note parameters
@@ -365,9 +368,42 @@ class NoteManager:
             log(TAG_NOTE, f"Error updating note {note_number}: {str(e)}", is_error=True)
             return False
             
+    def release_channel(self, channel=0):
+        """Release all notes on a channel in a single synth change.
+        
+        Args:
+            channel: MIDI channel, 0 releases every channel
+            
+        Returns:
+            Number of notes released
+        """
+        released = []
+        for address, note in self.notes.items():
+            note_number, note_channel = map(int, address.split("."))
+            if channel and note_channel != channel:
+                continue
+            released.append((address, note_number, note_channel, note))
+            
+        if not released:
+            return 0
+            
+        try:
+            # One atomic release for the whole batch
+            self.synth.change(release=[entry[3] for entry in released])
+        except Exception as e:
+            log(TAG_NOTE, f"Error releasing notes on channel {channel}: {str(e)}", is_error=True)
+            return 0
+            
+        # Remove from tracking and clean up blocks in the same pass
+        for address, note_number, note_channel, _ in released:
+            del self.notes[address]
+            if self.channel_map.get(note_channel) == note_number:
+                del self.channel_map[note_channel]
+            self.modulation.cleanup_note(note_number, note_channel)
+            
+        log(TAG_NOTE, f"Released {len(released)} notes on channel {channel}")
+        return len(released)
+        
     def release_all(self):
         """Release all active notes."""
-        # Convert to list to avoid modifying dict during iteration
-        for address in list(self.notes.keys()):
-            note_number, channel = map(int, address.split("."))
-            self.release_note(note_number, channel)
+        self.release_channel(0)
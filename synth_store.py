@@ -130,6 +130,22 @@ class SynthStore:
             
         return self.previous_values[channel].get(name, default)
         
+    def reset(self, channel=0):
+        """Clear stored values for one channel, keeping the update callback.
+        
+        Args:
+            channel: MIDI channel (1-15), 0 resets all channels
+        """
+        if not 0 <= channel <= 15:
+            log(TAG_STORE, f"Invalid channel {channel}", is_error=True)
+            return
+            
+        channels = range(1, 16) if channel == 0 else (channel,)
+        for ch in channels:
+            self.values[ch].clear()
+            self.previous_values[ch].clear()
+        log(TAG_STORE, f"Reset stored values for channel {channel}")
+        
     def clear(self):
         """Clear all stored values."""
         for channel in range(1, 16):
@@ -0,0 +1,23 @@
+"""Desktop test setup: CircuitPython module stubs and the repo's own modules.
+
+The firmware imports board, busio, supervisor and friends, which only exist
+on the device. Minimal stand-ins live in tests/stubs. The repo also has its
+own logging module, which must shadow the standard library one that pytest
+has already imported. The repo goes at the end of the path so code.py
+doesn't shadow the standard library's code module.
+"""
+
+import os
+import sys
+import importlib.util
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+
+sys.path.insert(0, os.path.join(TESTS_DIR, 'stubs'))
+sys.path.append(REPO_DIR)
+
+_spec = importlib.util.spec_from_file_location('logging', os.path.join(REPO_DIR, 'logging.py'))
+_logging = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_logging)
+sys.modules['logging'] = _logging
@@ -0,0 +1,4 @@
+"""Stand-in for CircuitPython's board module, every pin is its own name."""
+
+def __getattr__(name):
+    return name
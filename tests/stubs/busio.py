@@ -0,0 +1,37 @@
+"""Stand-in for CircuitPython's busio module, a UART backed by bytearrays."""
+
+class UART:
+    def __init__(self, tx=None, rx=None, baudrate=9600, **kwargs):
+        self.baudrate = baudrate
+        self.rx = bytearray()
+        self.tx = bytearray()
+
+    def write(self, data):
+        self.tx.extend(data)
+        return len(data)
+
+    def read(self, size=None):
+        count = len(self.rx) if size is None else min(size, len(self.rx))
+        if not count:
+            return None
+        data = bytes(self.rx[:count])
+        del self.rx[:count]
+        return data
+
+    def readinto(self, buf):
+        count = min(len(buf), len(self.rx))
+        if not count:
+            return None
+        buf[:count] = self.rx[:count]
+        del self.rx[:count]
+        return count
+
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+
+    def reset_input_buffer(self):
+        self.rx = bytearray()
+
+    def deinit(self):
+        pass
@@ -0,0 +1,6 @@
+"""Stand-in for CircuitPython's supervisor module."""
+
+import time
+
+def ticks_ms():
+    return int(time.monotonic() * 1000) & ((1 << 29) - 1)
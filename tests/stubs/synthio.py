@@ -0,0 +1,19 @@
+"""Stand-in for CircuitPython's synthio module, enough to import the router."""
+
+class _Block:
+    def __init__(self, *args, **kwargs):
+        self.__dict__.update(kwargs)
+
+Synthesizer = Note = Envelope = LFO = Math = BlockBiquad = _Block
+
+class MathOperation:
+    SUM = 0
+
+class FilterMode:
+    LOW_PASS = 0
+    HIGH_PASS = 1
+    BAND_PASS = 2
+    NOTCH = 3
+
+def midi_to_hz(note):
+    return 440 * 2 ** ((note - 69) / 12)
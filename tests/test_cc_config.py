@@ -0,0 +1,23 @@
+"""Binary CC config frames from encode_cc_config/decode_cc_config."""
+
+from router import encode_cc_config, decode_cc_config
+
+CONFIG = {'name': 'Rich Saw', 'pots': [(0, 74, 'Cutoff'), (1, 71, 'Res')]}
+
+def payload(frame):
+    return bytes(frame[1:-1])  # Between F0 and F7
+
+def test_round_trip():
+    assert decode_cc_config(payload(encode_cc_config(CONFIG))) == CONFIG
+
+def test_empty_config_round_trips():
+    config = {'name': '', 'pots': []}
+    assert decode_cc_config(payload(encode_cc_config(config))) == config
+
+def test_truncated_payloads_are_rejected():
+    data = payload(encode_cc_config(CONFIG))
+    for length in range(len(data)):
+        assert decode_cc_config(data[:length]) is None
+
+def test_other_sysex_is_rejected():
+    assert decode_cc_config(bytes((0x7E, 0x7F, 0x06, 0x01))) is None
@@ -0,0 +1,114 @@
+"""ConnectionManager baud negotiation over a LoopbackTransport."""
+
+import pytest
+
+from constants import (
+    ConnectionState, UART_BAUDRATE, UART_FAST_BAUDRATE,
+    CANDIDE_CAPS, CONFIG_HASH_ACK, BAUD_ACK, BAUD_ERROR_LIMIT
+)
+from uart import LoopbackTransport, TextProtocol
+from midi import MidiInterface
+from instruments import InstrumentManager
+from connection import ConnectionManager
+
+class FakeHardware:
+    """Base station detect pin, high until a test pulls it low"""
+    def __init__(self):
+        self.detected = True
+
+    def is_base_station_detected(self):
+        return self.detected
+
+    def poll_base_station(self):
+        return False
+
+class Link:
+    def __init__(self):
+        self.transport = LoopbackTransport()
+        self.midi = MidiInterface(self.transport)
+        self.hardware = FakeHardware()
+        self.manager = ConnectionManager(
+            TextProtocol(self.transport), self.midi, self.hardware)
+        instruments = InstrumentManager()
+        instruments.set_connection_manager(self.manager)
+        self.manager.set_instrument_manager(instruments)
+        instruments.set_midi_interface(self.midi)
+        instruments.set_instrument('rich_saw')
+
+    def update(self):
+        self.manager._wake()
+        self.manager.update_state()
+
+    def receive(self, data):
+        self.transport.feed(bytes(data))
+        self.midi.process_midi_messages()
+
+    def sent(self):
+        self.transport._drain(len(self.transport._tx_ring))
+        data = bytes(self.transport.tx)
+        self.transport.tx[:] = b''
+        return data
+
+    def connect(self):
+        """Detect, trade capabilities and confirm the config by hash"""
+        self.update()
+        self.receive((0xB0, 118, CANDIDE_CAPS))
+        self.receive((0xB0, 119, CONFIG_HASH_ACK))
+        assert self.manager.state == ConnectionState.CONNECTED
+        assert self.transport.text_framed
+        assert self.manager.baud_state == 'offered'
+        assert b'baud=250000' in self.sent()
+
+@pytest.fixture
+def link():
+    link = Link()
+    link.connect()
+    return link
+
+def test_ack_moves_to_fast_rate(link):
+    link.receive((0xB0, 119, BAUD_ACK))
+    assert link.manager.baud_state == 'checking'
+    assert link.transport.baudrate == UART_FAST_BAUDRATE
+    assert link.transport.uart.baudrate == UART_FAST_BAUDRATE
+    assert b'baud?' in link.sent()
+
+    link.receive((0xB0, 119, BAUD_ACK))
+    assert link.manager.baud_state == 'fast'
+    assert link.transport.baudrate == UART_FAST_BAUDRATE
+
+def test_rx_errors_fall_back(link):
+    link.receive((0xB0, 119, BAUD_ACK))
+    link.receive((0xB0, 119, BAUD_ACK))
+    link.sent()
+
+    # Stray data bytes with no status make the parser resync
+    link.receive((0x90, 0x40) * (BAUD_ERROR_LIMIT + 4))
+    link.manager.last_heartbeat_time = 0
+    link.update()
+    assert link.manager.baud_state is None
+    assert link.manager.baud_failed
+    assert link.transport.baudrate == UART_BAUDRATE
+    assert b'baud=31250' in link.sent()
+
+def test_missing_ack_times_out(link):
+    link.receive((0xB0, 119, BAUD_ACK))
+    assert link.manager.baud_state == 'checking'
+
+    link.manager.baud_time -= 1
+    link.update()
+    assert link.manager.baud_state is None
+    assert link.manager.baud_failed
+    assert link.transport.baudrate == UART_BAUDRATE
+
+def test_disconnect_resets_rate(link):
+    link.receive((0xB0, 119, BAUD_ACK))
+    link.receive((0xB0, 119, BAUD_ACK))
+    assert link.transport.baudrate == UART_FAST_BAUDRATE
+
+    link.hardware.detected = False
+    link.update()
+    assert link.manager.state == ConnectionState.STANDALONE
+    assert not link.manager.baud_failed
+    assert link.manager.baud_state is None
+    assert link.transport.baudrate == UART_BAUDRATE
+    assert not link.transport.text_framed
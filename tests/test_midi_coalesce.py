@@ -0,0 +1,34 @@
+"""MidiCoalescer holding continuous controllers within one update."""
+
+from midi import MidiInterface
+from uart import LoopbackTransport
+
+def interface():
+    transport = LoopbackTransport()
+    midi = MidiInterface(transport)
+    received = []
+    midi.subscribe(lambda msg: received.append(
+        (msg.status_byte, msg.data[0], msg.data[1])))
+    return transport, midi, received
+
+def test_continuous_cc_keeps_latest_value():
+    transport, midi, received = interface()
+    transport.feed(bytes((0xB1, 7, 10, 7, 20, 7, 30, 11, 40, 11, 50)))
+    midi.process_midi_messages()
+    assert received == [(0xB1, 7, 30), (0xB1, 11, 50)]
+    assert midi.coalescer.coalesced == 3
+
+def test_rpn_sequence_is_not_coalesced():
+    transport, midi, received = interface()
+    # RPN 0 (bend range) = 2, then RPN 1 (fine tuning) = 64
+    transport.feed(bytes((0xB0, 101, 0, 100, 0, 6, 2, 101, 0, 100, 1, 6, 64)))
+    midi.process_midi_messages()
+    assert received == [
+        (0xB0, 101, 0), (0xB0, 100, 0), (0xB0, 6, 2),
+        (0xB0, 101, 0), (0xB0, 100, 1), (0xB0, 6, 64)]
+
+def test_held_values_go_out_before_later_sequence_ccs():
+    transport, midi, received = interface()
+    transport.feed(bytes((0xB1, 7, 10, 7, 20, 64, 127, 7, 30)))
+    midi.process_midi_messages()
+    assert received == [(0xB1, 7, 20), (0xB1, 64, 127), (0xB1, 7, 30)]
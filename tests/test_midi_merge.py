@@ -0,0 +1,82 @@
+"""MidiInterface merging a second input into the UART stream."""
+
+from midi import MidiInterface
+from uart import LoopbackTransport
+from ticks import ticks_ms, ticks_add
+
+def merged():
+    uart = LoopbackTransport()
+    usb = LoopbackTransport()
+    midi = MidiInterface(uart)
+    midi.add_transport('usb', usb)
+    return midi, uart, usb
+
+def collect(midi, **filters):
+    received = []
+    # Messages are pooled, keep the raw bytes rather than the object
+    midi.subscribe(lambda msg: received.append(
+        (msg.status_byte, msg.data[0], msg.data[1])), **filters)
+    return received
+
+def test_both_inputs_reach_subscribers():
+    midi, uart, usb = merged()
+    received = collect(midi)
+    uart.feed(bytes((0x91, 60, 100)))
+    usb.feed(bytes((0x92, 64, 90)))
+    midi.process_midi_messages()
+    assert sorted(received) == [(0x91, 60, 100), (0x92, 64, 90)]
+
+def test_running_status_stays_per_source():
+    midi, uart, usb = merged()
+    received = collect(midi, message_types=['note_on'])
+    # Each input stops mid-message, then continues on running status
+    uart.feed(bytes((0x91, 60)))
+    usb.feed(bytes((0x92, 64, 90, 65)))
+    midi.process_midi_messages()
+    uart.feed(bytes((100, 61, 100)))
+    usb.feed(bytes((91,)))
+    midi.process_midi_messages()
+    assert sorted(received) == [
+        (0x91, 60, 100), (0x91, 61, 100), (0x92, 64, 90), (0x92, 65, 91)]
+
+def test_sysex_does_not_leak_between_sources():
+    midi, uart, usb = merged()
+    received = collect(midi, message_types=['note_on'])
+    sysex = []
+    midi.set_sysex_callback(lambda data: sysex.append(bytes(data)))
+    usb.feed(bytes((0xF0, 1, 2)))
+    uart.feed(bytes((0x91, 60, 100)))
+    midi.process_midi_messages()
+    usb.feed(bytes((0xF7,)))
+    midi.process_midi_messages()
+    assert received == [(0x91, 60, 100)]
+    assert sysex == [b'\x01\x02']
+
+def test_accept_masks_reach_every_source():
+    midi, uart, usb = merged()
+    received = collect(midi, message_types=['note_on'], channels=[1])
+    late = LoopbackTransport()
+    midi.add_transport('late', late)
+    for source in midi.sources:
+        assert source.parser.accepts(0x91, 60)
+        assert not source.parser.accepts(0x92, 60)
+        assert not source.parser.accepts(0xB1, 7)
+
+    usb.feed(bytes((0x92, 60, 100, 0xB1, 7, 20)))
+    late.feed(bytes((0x91, 62, 100)))
+    midi.process_midi_messages()
+    assert received == [(0x91, 62, 100)]
+
+def test_throughput_counts_each_source():
+    midi, uart, usb = merged()
+    collect(midi)
+    uart.feed(bytes((0x91, 60, 100)))
+    usb.feed(bytes((0x92, 64, 90, 0x82, 64, 0)))
+    midi.process_midi_messages()
+    throughput = midi.get_throughput()
+    assert throughput['sources'] == {'uart': 3, 'usb': 6}
+    assert throughput['bytes_total'] == 9
+
+    # Age the window past a second so it rolls over on the next read
+    midi._rx_window_start = ticks_add(ticks_ms(), -2000)
+    assert 3 <= midi.get_throughput()['bytes_per_sec'] <= 4
@@ -0,0 +1,86 @@
+"""MidiParser running status: the same messages decode the same either way."""
+
+from midi import MidiParser, MPEMessageCounter, MPE_FILTER_CONFIG, replay_capture
+from ticks import ticks_ms, ticks_add
+
+# (status, data...) in send order, values far enough apart to pass thresholds
+MESSAGES = [
+    (0x91, 60, 100),
+    (0x91, 64, 90),
+    (0x91, 67, 80),
+    (0xB1, 7, 10),
+    (0xB1, 7, 20),
+    (0xB1, 7, 30),
+    (0xD1, 10),
+    (0xD1, 40),
+    (0xE1, 0x00, 0x30),
+    (0xE1, 0x00, 0x50),
+    (0xC2, 3),
+    (0xC2, 4),
+    (0x81, 60, 0),
+    (0x81, 64, 0),
+    (0x81, 67, 0),
+]
+
+def explicit_stream(messages):
+    stream = bytearray()
+    for message in messages:
+        stream.extend(message)
+    return bytes(stream)
+
+def running_stream(messages):
+    stream = bytearray()
+    status = None
+    for message in messages:
+        if message[0] != status:
+            stream.append(message[0])
+            status = message[0]
+        stream.extend(message[1:])
+    return bytes(stream)
+
+def decode(stream):
+    parser = MidiParser(MPEMessageCounter())
+    decoded = []
+    for byte in stream:
+        msg = parser.process_byte(byte)
+        if msg and msg.type != 'unknown':
+            decoded.append((msg.status_byte, msg.data[0], msg.data[1]))
+    return decoded
+
+def replay(stream):
+    line = f"cap 0 0 {stream.hex()}"
+    decoded = []
+    replay_capture([line], lambda tick, msg: decoded.append(
+        (msg.status_byte, msg.data[0], msg.data[1])))
+    return decoded
+
+def test_running_status_is_shorter():
+    assert len(running_stream(MESSAGES)) < len(explicit_stream(MESSAGES))
+
+def test_running_status_decodes_like_explicit_status():
+    explicit = decode(explicit_stream(MESSAGES))
+    assert len(explicit) == len(MESSAGES)
+    assert decode(running_stream(MESSAGES)) == explicit
+
+def test_replayed_capture_decodes_like_explicit_status():
+    assert replay(running_stream(MESSAGES)) == replay(explicit_stream(MESSAGES))
+    assert len(replay(running_stream(MESSAGES))) == len(MESSAGES)
+
+def test_realtime_bytes_keep_running_status():
+    stream = bytes((0x91, 60, 0xF8, 100, 64, 0xFE, 90))
+    assert decode(stream) == [(0x91, 60, 100), (0x91, 64, 90)]
+
+def test_system_common_cancels_running_status():
+    # Song select takes one data byte, the next two are strays
+    stream = bytes((0x91, 60, 100, 0xF3, 5, 64, 90))
+    assert decode(stream) == [(0x91, 60, 100)]
+
+def test_replay_rate_limits_on_captured_ticks(monkeypatch):
+    monkeypatch.setitem(MPE_FILTER_CONFIG, 'pitch_bend_rate', 100)
+    # A bend every 10ms fits 100/sec, on a device clock far from this one
+    start = ticks_add(ticks_ms(), 1 << 27)
+    lines = [f"cap {ticks_add(start, n * 10)} 0 "
+             f"{bytes((0xE1, 0, 0x20 + n * 4)).hex()}" for n in range(20)]
+    decoded = []
+    replay_capture(lines, lambda tick, msg: decoded.append(msg.bend))
+    assert len(decoded) == 20
@@ -0,0 +1,62 @@
+"""MidiEventQueue backpressure and budgets through MidiInterface."""
+
+from midi import MidiInterface
+from uart import LoopbackTransport
+
+def interface():
+    transport = LoopbackTransport()
+    midi = MidiInterface(transport)
+    received = []
+    midi.subscribe(lambda msg: received.append(
+        (msg.status_byte, msg.data[0], msg.data[1])))
+    return transport, midi, received
+
+def run(midi, updates=50):
+    for _ in range(updates):
+        midi.process_midi_messages()
+
+def test_distinct_ccs_are_not_dropped():
+    transport, midi, received = interface()
+    # CC74 is MPE timbre, which has its own threshold filter
+    sent = [(0xB0 | (n % 4), n, n) for n in range(101) if n != 74]
+    for message in sent:
+        transport.feed(bytes(message))
+    run(midi)
+    assert midi.event_queue.dropped == 0
+    assert sorted(received) == sorted(sent)
+
+def test_held_values_keep_newest_under_load():
+    transport, midi, received = interface()
+    midi.event_budget = 4
+    for n in range(16):
+        for value in (10, 20, 30):
+            transport.feed(bytes((0xB0 | n, 7, value, 0xB0 | n, 11, value)))
+    run(midi)
+    assert midi.event_queue.dropped == 0
+    for n in range(16):
+        assert [m for m in received if m[0] == 0xB0 | n][-2:] == [
+            (0xB0 | n, 7, 30), (0xB0 | n, 11, 30)]
+
+def test_deferred_counts_each_event_once():
+    transport, midi, received = interface()
+    midi.event_budget = 3
+    for n in range(10):
+        transport.feed(bytes((0x91, 40 + n, 100)))
+    run(midi, 5)
+    assert len(received) == 10
+    assert midi.event_queue.deferred == 7
+
+def test_paused_source_does_not_stop_the_others():
+    transport, midi, received = interface()
+    usb = LoopbackTransport()
+    midi.add_transport('usb', usb)
+    midi.event_budget = 8
+    for n in range(100):
+        transport.feed(bytes((0x91, n, 100)))
+    usb.feed(bytes((0x92, 60, 100)))
+    midi.process_midi_messages()
+    assert midi.event_queue.rx_paused
+    run(midi)
+    assert midi.event_queue.dropped == 0
+    assert (0x92, 60, 100) in received
+    assert [m for m in received if m[0] == 0x91] == [(0x91, n, 100) for n in range(100)]
@@ -0,0 +1,50 @@
+"""MidiThru sharing the UART TX with text output."""
+
+from midi import MidiInterface, MidiParser, MPEMessageCounter
+from uart import LoopbackTransport, TextProtocol
+
+def thru_link():
+    transport = LoopbackTransport()
+    midi = MidiInterface(transport)
+    midi.subscribe(lambda msg: None)
+    midi.enable_thru()
+    return transport, midi, TextProtocol(transport)
+
+def sent(transport):
+    transport._drain(len(transport._tx_ring))
+    data = bytes(transport.tx)
+    transport.tx[:] = b''
+    return data
+
+def received_notes(data):
+    """Note ons a base station decodes from data, text split off as on RX"""
+    receiver = LoopbackTransport()
+    receiver.feed(data)
+    buf = bytearray(len(data))
+    count = receiver.readinto(buf)
+    parser = MidiParser(MPEMessageCounter())
+    notes = []
+    for i in range(count):
+        msg = parser.process_byte(buf[i])
+        if msg and msg.type == 'note_on':
+            notes.append((msg.channel, msg.note, msg.velocity))
+    return notes
+
+def test_thru_held_while_text_unframed():
+    transport, midi, text = thru_link()
+    transport.feed(bytes((0x90, 0x3C, 0x64)))
+    midi.process_midi_messages()
+    text.write_heartbeat()
+    assert sent(transport) == text._heartbeat_frames[0]
+    assert midi.get_thru_stats()['uart']['held'] == 1
+
+def test_framed_text_keeps_thru_output_clean():
+    transport, midi, text = thru_link()
+    transport.text_framed = True
+    transport.feed(bytes((0x90, 0x3C, 0x64)))
+    midi.process_midi_messages()
+    text.write_heartbeat()
+    text.write("stats|x=1")
+    data = sent(transport)
+    assert data.startswith(bytes((0x90, 0x3C, 0x64, 0xF4)))
+    assert received_notes(data) == [(0, 0x3C, 0x64)]
@@ -0,0 +1,49 @@
+"""TextProtocol lines shared between command handlers and readers."""
+
+from uart import LoopbackTransport, TextProtocol
+
+def protocol():
+    transport = LoopbackTransport()
+    text = TextProtocol(transport)
+    text.add_command("stats?", lambda: "stats|x=1")
+    return transport, text
+
+def receive(transport, data):
+    buf = bytearray(64)
+    transport.feed(data)
+    while transport.readinto(buf):
+        pass
+
+def sent(transport):
+    transport._drain(len(transport._tx_ring))
+    data = bytes(transport.tx)
+    transport.tx[:] = b''
+    return data
+
+def test_unmatched_lines_stay_queued():
+    transport, text = protocol()
+    receive(transport, b'\xf4hello\n')
+    text.process_commands()
+    assert text.read_line() == 'hello'
+    assert text.read_line() is None
+
+def test_commands_answered_around_other_lines():
+    transport, text = protocol()
+    receive(transport, b'\xf4hello\n\xf4[3[stats?]3]\n\xf4world\n\xf4par')
+    text.process_commands()
+    assert sent(transport) == b'[0[stats|x=1]0]\n'
+    receive(transport, b'tial\n')
+    text.process_commands()
+    assert sent(transport) == b''
+    assert text.read() == 'hello\nworld\npartial\n'
+
+def test_lines_are_checked_once():
+    transport, text = protocol()
+    receive(transport, b'\xf4hello\n')
+    text.process_commands()
+    text.process_commands()
+    receive(transport, b'\xf4stats?\n')
+    text.process_commands()
+    assert sent(transport) == b'[0[stats|x=1]0]\n'
+    assert text.read_frame()[1] == b'hello'
+    assert text.read_frame() is None
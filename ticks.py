@@ -0,0 +1,20 @@
+"""Wrap-safe millisecond tick helpers built on supervisor.ticks_ms()."""
+
+import supervisor
+
+_TICKS_PERIOD = 1 << 29
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+def ticks_ms():
+    """Get the current millisecond tick count (wraps every ~6 days)."""
+    return supervisor.ticks_ms()
+
+def ticks_add(ticks, delta):
+    """Offset a tick value, wrapping like ticks_ms()."""
+    return (ticks + delta) % _TICKS_PERIOD
+
+def ticks_diff(ticks1, ticks2):
+    """Signed difference ticks1 - ticks2 in milliseconds, safe across wraps."""
+    diff = (ticks1 - ticks2) & _TICKS_MAX
+    return ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
@@ -3,22 +3,49 @@
 import time
 import busio
 import sys
+import array
 from constants import (
-    UART_TX, UART_RX, UART_BAUDRATE, UART_TIMEOUT,
-    MESSAGE_TIMEOUT
+    UART_TX, UART_RX, UART_BAUDRATE, UART_TIMEOUT, UART_RX_BUFFER_SIZE,
+    UART_TX_BUFFER_SIZE, UART_TX_CHUNK_SIZE, MESSAGE_TIMEOUT,
+    TEXT_FRAME_START, TEXT_FRAME_END, TEXT_LINE_MAX, TEXT_LINE_SLOTS,
+    HEARTBEAT_MESSAGE
 )
-from logging import log, TAG_UART
+from logging import log, TAG_UART, LOG_ENABLE
+from ticks import ticks_ms, ticks_diff
 
 class UartTransport:
     """UART transport layer"""
     def __init__(self, tx_pin=UART_TX, rx_pin=UART_RX, 
-                 baudrate=UART_BAUDRATE, timeout=UART_TIMEOUT):
+                 baudrate=UART_BAUDRATE, timeout=UART_TIMEOUT,
+                 rx_buffer_size=UART_RX_BUFFER_SIZE):
         self.tx_pin = tx_pin
         self.rx_pin = rx_pin
         self.baudrate = baudrate
         self.timeout = timeout
-        self._tx_queue = []       # Simple list for CircuitPython
-        self._tx_busy = False     # Flag to track if currently sending
+        self.rx_buffer_size = rx_buffer_size
+        
+        # TX ring drained by update() at no more than the wire rate, so a
+        # write only ever costs a copy
+        self._tx_ring = bytearray(UART_TX_BUFFER_SIZE)
+        self._tx_view = memoryview(self._tx_ring)
+        self._tx_head = 0
+        self._tx_count = 0
+        self._tx_last_drain = ticks_ms()
+        self.last_tx_time = 0  # Tick of the last byte handed to the UART
+        self.tx_bytes_total = 0
+        self.tx_dropped = 0  # Low priority writes dropped for lack of room
+        self.tx_blocked = 0  # Writes that had to wait for room
+        
+        # RX demultiplexing: MIDI bytes go to the caller's buffer, text
+        # frames (TEXT_FRAME_START ... TEXT_FRAME_END) go to text_sink
+        self._rx_buffer = bytearray(64)
+        self._rx_view = memoryview(self._rx_buffer)
+        self._in_text = False
+        self.text_sink = None  # Callback taking a memoryview of text bytes
+        self.text_frames = 0
+        # Outgoing text gets the same framing once the base station takes it,
+        # until then the TX carries text MIDI output must not be mixed into
+        self.text_framed = False
         self._initialize_uart()
 
     def _initialize_uart(self):
@@ -26,56 +53,176 @@ class UartTransport:
         try:
             self.uart = busio.UART(self.tx_pin, self.rx_pin,
                                  baudrate=self.baudrate,
-                                 timeout=self.timeout)
-            log(TAG_UART, f"UART initialized: baudrate={self.baudrate}, timeout={self.timeout}")
+                                 timeout=self.timeout,
+                                 receiver_buffer_size=self.rx_buffer_size)
+            log(TAG_UART, f"UART initialized: baudrate={self.baudrate}, timeout={self.timeout}, "
+                f"rx buffer={self.rx_buffer_size} ({self.rx_capacity_ms}ms)")
         except Exception as e:
             log(TAG_UART, f"UART initialization failed: {str(e)}", is_error=True)
             raise
 
-    def write(self, data):
-        """Write data to UART"""
+    def write(self, data, low_priority=False):
+        """Queue data for transmission.
+        
+        Messages are queued whole or not at all. Low priority data is
+        dropped when the ring is full, anything else waits for room.
+        
+        Returns:
+            Number of bytes queued
+        """
         if not data:
             return 0
             
         # Convert to bytes if string
-        data_bytes = bytes(data) if isinstance(data, str) else data
+        data_bytes = data.encode('utf-8') if isinstance(data, str) else data
+        length = len(data_bytes)
+        size = len(self._tx_ring)
         
-        # Add to queue
-        self._tx_queue.append(data_bytes)
-        
-        # Process queue if not busy
-        if not self._tx_busy:
-            return self._process_tx_queue()
-        return len(data_bytes)  # Return length of queued data
-
-    def _process_tx_queue(self):
-        """Process queued TX messages one at a time"""
-        if self._tx_busy or not self._tx_queue:
-            return 0
+        if length > size - self._tx_count:
+            if low_priority:
+                self.tx_dropped += 1
+                return 0
+            # Backpressure: block until the ring has room
+            self.tx_blocked += 1
+            self._drain(size)
+            if length > size:
+                # Larger than the ring, send it directly
+                return self._send(data_bytes)
+                
+        tail = (self._tx_head + self._tx_count) % size
+        first = min(length, size - tail)
+        self._tx_ring[tail:tail + first] = data_bytes[:first]
+        if first < length:
+            self._tx_ring[:length - first] = data_bytes[first:]
+        self._tx_count += length
+        return length
 
+    def _send(self, data):
+        """Hand bytes to the UART"""
         try:
-            self._tx_busy = True
-            data = self._tx_queue.pop(0)  # Use pop(0) instead of popleft()
-            bytes_written = self.uart.write(data)
-            return bytes_written
+            written = self.uart.write(data) or 0
         except Exception as e:
             log(TAG_UART, f"TX error: {str(e)}", is_error=True)
             return 0
-        finally:
-            self._tx_busy = False
-            # Process next message if queue not empty
-            if self._tx_queue:
-                self._process_tx_queue()
+        self.tx_bytes_total += written
+        self.last_tx_time = ticks_ms()
+        return written
+
+    def _drain(self, limit):
+        """Send up to limit bytes from the ring"""
+        size = len(self._tx_ring)
+        while limit > 0 and self._tx_count:
+            # Contiguous run from the head
+            count = min(limit, self._tx_count, size - self._tx_head)
+            self._send(self._tx_view[self._tx_head:self._tx_head + count])
+            self._tx_head = (self._tx_head + count) % size
+            self._tx_count -= count
+            limit -= count
+
+    def update(self):
+        """Drain queued TX bytes, at most what the wire sent since last time"""
+        now = ticks_ms()
+        if not self._tx_count:
+            self._tx_last_drain = now
+            return
+        # Bytes the wire moved since the last drain (10 bits per byte),
+        # so the UART FIFO has room and the write returns immediately
+        elapsed = ticks_diff(now, self._tx_last_drain)
+        budget = min(UART_TX_CHUNK_SIZE, elapsed * self.baudrate // 10000)
+        if budget:
+            self._drain(budget)
+            self._tx_last_drain = now
+
+    def set_baudrate(self, baudrate):
+        """Change the link rate once everything queued has gone out at the old one"""
+        if baudrate == self.baudrate:
+            return
+        self._drain(len(self._tx_ring))
+        # Let the UART FIFO empty before the rate changes under it
+        time.sleep(UART_TX_CHUNK_SIZE * 10 / self.baudrate)
+        try:
+            self.uart.baudrate = baudrate
+        except Exception as e:
+            log(TAG_UART, f"Baud rate change failed: {str(e)}", is_error=True)
+            return
+        self.baudrate = baudrate
+        self._tx_last_drain = ticks_ms()
+        log(TAG_UART, f"Baud rate set to {baudrate} (rx buffer {self.rx_capacity_ms}ms)")
+
+    @property
+    def tx_pending(self):
+        """Bytes queued but not yet handed to the UART"""
+        return self._tx_count
+
+    @property
+    def tx_free(self):
+        """Room left in the TX ring"""
+        return len(self._tx_ring) - self._tx_count
 
     def read(self, size=None):
-        """Read from UART"""
-        data = self.uart.read(size) if size is not None else self.uart.read()
-        if data:
+        """Read MIDI bytes from UART"""
+        buf = bytearray(size if size is not None else max(1, self.in_waiting))
+        count = self.readinto(buf)
+        if not count:
+            return None
+        data = bytes(buf[:count])
+        if LOG_ENABLE[TAG_UART]:
             # Convert bytes to hex representation for logging
             hex_data = ' '.join([f'0x{b:02x}' for b in data])
             log(TAG_UART, f"Received bytes: {hex_data}")
         return data
 
+    def readinto(self, buf):
+        """Read MIDI bytes into a preallocated buffer, text goes to text_sink.
+        
+        Returns:
+            Number of MIDI bytes placed in buf
+        """
+        size = min(len(buf), len(self._rx_buffer))
+        while True:
+            count = self.uart.readinto(self._rx_view[:size])
+            if not count:
+                return 0
+            midi_count = self._demux(buf, count)
+            # A read that was all text should not look like an empty UART
+            if midi_count or not self.in_waiting:
+                return midi_count
+
+    def _demux(self, buf, count):
+        """Split count raw bytes into MIDI (compacted into buf) and text spans"""
+        raw = self._rx_buffer
+        view = self._rx_view
+        midi_count = 0
+        i = 0
+        while i < count:
+            if self._in_text:
+                end = raw.find(TEXT_FRAME_END, i, count)
+                stop = count if end < 0 else end + 1
+                if self.text_sink:
+                    self.text_sink(view[i:stop])
+                if end >= 0:
+                    self._in_text = False
+                i = stop
+            else:
+                start = raw.find(TEXT_FRAME_START, i, count)
+                stop = count if start < 0 else start
+                length = stop - i
+                if length:
+                    buf[midi_count:midi_count + length] = view[i:stop]
+                    midi_count += length
+                if start >= 0:
+                    self._in_text = True
+                    self.text_frames += 1
+                    i = start + 1
+                else:
+                    i = stop
+        return midi_count
+
+    @property
+    def rx_capacity_ms(self):
+        """Time the RX buffer can absorb at the current baud rate (10 bits per byte)"""
+        return self.rx_buffer_size * 10000 // self.baudrate
+
     @property
     def in_waiting(self):
         """Get number of bytes waiting in receive buffer"""
@@ -93,9 +240,10 @@ class UartTransport:
             # Fallback for CircuitPython UART
             while self.in_waiting:
                 self.uart.read()
-        # Clear TX queue
-        self._tx_queue.clear()
-        self._tx_busy = False
+        self._in_text = False
+        # Clear TX ring
+        self._tx_head = 0
+        self._tx_count = 0
         log(TAG_UART, "Buffers flushed")
 
     def cleanup(self):
@@ -105,14 +253,139 @@ class UartTransport:
             self.flush_buffers()
             self.uart.deinit()
 
+class UsbMidiTransport:
+    """USB MIDI input port exposed with the transport read interface"""
+    def __init__(self, chunk_size=64):
+        import usb_midi  # Only present when USB MIDI is enabled in boot.py
+        self.port = None
+        for port in usb_midi.ports:
+            if isinstance(port, usb_midi.PortIn):
+                self.port = port
+                break
+        if self.port is None:
+            raise RuntimeError("No USB MIDI input port")
+        self.chunk_size = chunk_size
+        self.rx_buffer_size = 0  # Flow controlled by the host, never overflows
+        self.rx_capacity_ms = 0
+        log(TAG_UART, "USB MIDI input initialized")
+
+    def read(self, size=None):
+        """Read from USB MIDI"""
+        return self.port.read(size if size is not None else self.chunk_size)
+
+    def readinto(self, buf):
+        """Read into a preallocated buffer, returns number of bytes read"""
+        count = self.port.readinto(buf)
+        return count if count else 0
+
+    @property
+    def in_waiting(self):
+        """USB reads never block, so report a full chunk as possibly waiting"""
+        return self.chunk_size
+
+    def write(self, data, low_priority=False):
+        return 0
+
+    def update(self):
+        pass
+
+    def flush_buffers(self):
+        buf = bytearray(self.chunk_size)
+        while self.readinto(buf):
+            pass
+
+    def cleanup(self):
+        self.port = None
+
+class MemoryUart:
+    """busio.UART stand-in backed by bytearrays"""
+    def __init__(self, baudrate=UART_BAUDRATE, loopback=False):
+        self.baudrate = baudrate
+        self.loopback = loopback
+        self.rx = bytearray()
+        self.tx = bytearray()
+
+    def write(self, data):
+        self.tx.extend(data)
+        if self.loopback:
+            self.rx.extend(data)
+        return len(data)
+
+    def read(self, size=None):
+        count = len(self.rx) if size is None else min(size, len(self.rx))
+        if not count:
+            return None
+        data = bytes(self.rx[:count])
+        del self.rx[:count]
+        return data
+
+    def readinto(self, buf):
+        count = min(len(buf), len(self.rx))
+        if not count:
+            return None
+        buf[:count] = self.rx[:count]
+        del self.rx[:count]
+        return count
+
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+
+    def reset_input_buffer(self):
+        self.rx = bytearray()
+
+    def deinit(self):
+        pass
+
+class LoopbackTransport(UartTransport):
+    """UartTransport over an in-memory UART for desktop testing.
+    
+    Bytes given to feed() are received, bytes drained from the TX ring
+    collect in tx and can be looped straight back to RX.
+    """
+    def __init__(self, loopback=False, baudrate=UART_BAUDRATE):
+        self.loopback = loopback
+        super().__init__(baudrate=baudrate)
+
+    def _initialize_uart(self):
+        self.uart = MemoryUart(self.baudrate, self.loopback)
+
+    def feed(self, data):
+        """Queue bytes to be received"""
+        self.uart.rx.extend(data)
+
+    @property
+    def tx(self):
+        return self.uart.tx
+
 class TextProtocol:
     """Text protocol interface"""
     def __init__(self, transport):
         self.transport = transport
         self.message_timeout = MESSAGE_TIMEOUT
         self._message_counter = 0  # Counter for message numbering (0-9)
+        
+        # Incoming lines assemble in place in fixed slots: complete lines
+        # wait in [read_slot, read_slot + ready), the next slot fills
+        self._lines = bytearray(TEXT_LINE_MAX * TEXT_LINE_SLOTS)
+        self._lines_view = memoryview(self._lines)
+        self._line_lengths = array.array('H', [0] * TEXT_LINE_SLOTS)
+        self._read_slot = 0
+        self._ready = 0
+        self._overflow = False
+        self.lines_overflowed = 0  # Lines longer than TEXT_LINE_MAX
+        self.lines_dropped = 0  # Complete lines overwritten before being read
+        self._checked = 0  # Complete lines at the front already matched against commands
+        transport.text_sink = self.receive
+        self._commands = []  # (encoded line, handler) pairs
+        
+        # Heartbeat frames for every counter value, encoded once, bare and framed
+        self._heartbeat_frames = tuple(
+            f"[{n}[{HEARTBEAT_MESSAGE}]{n}]\n".encode('utf-8') for n in range(10))
+        self._framed_heartbeat_frames = tuple(
+            TEXT_FRAME_START + frame for frame in self._heartbeat_frames)
 
-    def write(self, message):
+    def write(self, message, low_priority=False):
         if not isinstance(message, str):
             message = str(message)
         # Get current counter value and increment
@@ -122,24 +395,173 @@ class TextProtocol:
         message = f"[{n}[{message.strip()}]{n}]"
         if not message.endswith('\n'):
             message += '\n'
-        return self.transport.write(message.encode('utf-8'))
+        data = message.encode('utf-8')
+        if self.transport.text_framed:
+            # One write, so MIDI thru can't land inside the frame
+            data = TEXT_FRAME_START + data
+        return self.transport.write(data, low_priority)
+
+    def write_heartbeat(self):
+        """Send a pre-encoded heartbeat frame, dropped if the TX ring is full"""
+        n = self._message_counter
+        self._message_counter = (n + 1) % 10
+        if self.transport.text_framed:
+            return self.transport.write(self._framed_heartbeat_frames[n], True)
+        return self.transport.write(self._heartbeat_frames[n], True)
+
+    def write_bytes(self, data, low_priority=False):
+        """Send raw bytes (e.g. a SysEx frame) without text framing"""
+        return self.transport.write(data, low_priority)
+
+    def receive(self, data):
+        """Assemble text bytes from the shared RX stream into lines.
+        
+        The transport splits spans at line ends, so a line end can only be
+        the last byte of data.
+        """
+        count = len(data)
+        if not count:
+            return
+        complete = data[count - 1] == TEXT_FRAME_END[0]
+        if complete:
+            count -= 1
+            
+        slot = (self._read_slot + self._ready) % TEXT_LINE_SLOTS
+        length = self._line_lengths[slot]
+        room = TEXT_LINE_MAX - length
+        if count > room:
+            self._overflow = True
+            count = room
+        if count:
+            start = slot * TEXT_LINE_MAX + length
+            self._lines[start:start + count] = data[:count]
+            self._line_lengths[slot] = length + count
+            
+        if not complete:
+            return
+        if self._overflow:
+            # Drop the whole line rather than deliver a truncated one
+            self._overflow = False
+            self._line_lengths[slot] = 0
+            self.lines_overflowed += 1
+            return
+        if self._ready == TEXT_LINE_SLOTS - 1:
+            # Keep a slot to assemble into, lose the oldest unread line
+            self._read_slot = (self._read_slot + 1) % TEXT_LINE_SLOTS
+            self.lines_dropped += 1
+            if self._checked:
+                self._checked -= 1
+        else:
+            self._ready += 1
+        self._line_lengths[(self._read_slot + self._ready) % TEXT_LINE_SLOTS] = 0
+
+    def _slot_line(self, slot):
+        """View of the line held in a slot"""
+        length = self._line_lengths[slot]
+        start = slot * TEXT_LINE_MAX
+        if length and self._lines[start + length - 1] == 0x0D:  # Tolerate CRLF
+            length -= 1
+        return self._lines_view[start:start + length]
+
+    def read_line_view(self):
+        """Pop the next complete line as a memoryview into its slot.
+        
+        The view stays valid until TEXT_LINE_SLOTS - 1 more lines arrive
+        or process_commands() runs.
+        """
+        if not self._ready:
+            return None
+        slot = self._read_slot
+        self._read_slot = (slot + 1) % TEXT_LINE_SLOTS
+        self._ready -= 1
+        if self._checked:
+            self._checked -= 1
+        return self._slot_line(slot)
 
     def read(self, size=None):
-        data = self.transport.read(size)
-        return data.decode('utf-8') if data else None
+        """Return routed text: every complete line waiting, each ending in a newline.
+        
+        Partial lines wait for more bytes. size is accepted for compatibility,
+        whole lines are always returned.
+        """
+        if not self._ready:
+            return None
+        text = ''
+        while self._ready:
+            text += bytes(self.read_line_view()).decode('utf-8') + '\n'
+        return text
 
     def read_line(self):
-        buffer = bytearray()
-        while True:
-            if self.transport.in_waiting:
-                byte = self.transport.read(1)
-                if byte == b'\n':
-                    return buffer.decode('utf-8')
-                buffer.extend(byte)
-            else:
-                return None
+        """Return the next complete line, partial lines wait for more bytes"""
+        line = self.read_line_view()
+        return bytes(line).decode('utf-8') if line is not None else None
+
+    def read_frame(self):
+        """Pop the next line split into its [n[...]n] framing.
+        
+        Returns:
+            (n, payload memoryview), n is None for unframed lines, or None
+            if no line is complete
+        """
+        line = self.read_line_view()
+        if line is None:
+            return None
+        return self._split_frame(line)
+
+    def _split_frame(self, line):
+        """Split a line into (n, payload), n is None for unframed lines"""
+        length = len(line)
+        if (length >= 6 and line[0] == 0x5B and line[2] == 0x5B and
+                line[length - 3] == 0x5D and line[length - 1] == 0x5D and
+                line[1] == line[length - 2] and 0x30 <= line[1] <= 0x39):
+            return line[1] - 0x30, line[3:length - 3]
+        return None, line
+
+    def add_command(self, name, handler):
+        """Answer incoming lines equal to name with handler()'s return string"""
+        self._commands.append((name.encode('utf-8'), handler))
+
+    def process_commands(self):
+        """Answer complete command lines, framed or not.
+        
+        Answered lines are removed, other lines stay queued in order for
+        read(), read_line() and read_frame(). Each line is checked once.
+        """
+        if self._checked == self._ready:
+            return
+        lengths = self._line_lengths
+        kept = self._checked
+        for k in range(self._checked, self._ready + 1):
+            slot = (self._read_slot + k) % TEXT_LINE_SLOTS
+            if k < self._ready:
+                payload = bytes(self._split_frame(self._slot_line(slot))[1])
+                handler = None
+                for name, command_handler in self._commands:
+                    if payload == name:
+                        handler = command_handler
+                        break
+                if handler:
+                    self.write(handler())
+                    continue
+            # Close the gap left by answered lines, the line still
+            # assembling (k == ready) moves along with the rest
+            if kept != k:
+                target = (self._read_slot + kept) % TEXT_LINE_SLOTS
+                length = lengths[slot]
+                start = slot * TEXT_LINE_MAX
+                self._lines[target * TEXT_LINE_MAX:target * TEXT_LINE_MAX + length] = \
+                    self._lines_view[start:start + length]
+                lengths[target] = length
+            kept += 1
+        self._ready = kept - 1
+        self._checked = self._ready
 
     def flush_buffers(self):
+        self._read_slot = 0
+        self._ready = 0
+        self._checked = 0
+        self._overflow = False
+        self._line_lengths[0] = 0
         self.transport.flush_buffers()
 
     def cleanup(self):